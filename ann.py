@@ -1,10 +1,11 @@
 import numpy as np
-import keras
 
 
 def create_ANN_Keras(n_input, n_hidden, n_output):
     """Creates a simple artificial neural network similar to class ANN but using Keras.
     """
+    import keras  # optional, only needed for the Keras networks
+
     model = keras.models.Sequential()
     model.add(keras.layers.Dense(n_hidden, input_dim=n_input, init='normal'))
     model.add(keras.layers.Activation('sigmoid'))
@@ -48,11 +49,13 @@ class ANN(object):
                                     -(1. - wanted) * np.log(1. - outputs)))
 
 
-    def __init__(self, n_input, n_hidden, n_output):
+    def __init__(self, n_input, n_hidden, n_output, sparse=False):
         self.sizes = (n_input, n_hidden, n_output)
         self.n_input = n_input
         self.n_hidden = n_hidden
         self.n_output = n_output
+        # mostly zero inputs (e.g. view fields): use only the nonzero ones
+        self.sparse = sparse
         self.init_weights()
 
     def init_weights(self):
@@ -66,38 +69,79 @@ class ANN(object):
         self.output_weights = np.random.randn(self.n_output, self.n_hidden)
         self.output_weights /= np.sqrt(self.n_hidden)
 
+    @staticmethod
+    def active_inputs(inputs):
+        """
+        Return the indices of the inputs that are nonzero in any sample.
+        """
+        if inputs.ndim == 1:
+            return np.flatnonzero(inputs)
+        return np.flatnonzero(inputs.any(axis=0))
+
+    def hidden_zeta(self, inputs, active=None):
+        """
+        Weighted inputs of the hidden layer. If the indices of the active
+        (nonzero) inputs are given, only their weight columns are used.
+        """
+        if active is None:
+            return np.dot(inputs, self.hidden_weights.T) + self.hidden_bias
+        return (np.dot(inputs[..., active], self.hidden_weights[:, active].T)
+                + self.hidden_bias)
+
     def feedforward(self, inputs):
         """
         Activate inputs through the network.
+        The inputs may be a single data vector or a matrix with one
+        sample per row.
         """
-        hidden_activated = ANN.sigmoid(np.dot(self.hidden_weights, inputs)
-                                       + self.hidden_bias)
-        output_activated = ANN.sigmoid(np.dot(self.output_weights, hidden_activated)
+        inputs = np.asarray(inputs)
+        active = ANN.active_inputs(inputs) if self.sparse else None
+        hidden_activated = ANN.sigmoid(self.hidden_zeta(inputs, active))
+        output_activated = ANN.sigmoid(np.dot(hidden_activated, self.output_weights.T)
                                        + self.output_bias)
         return output_activated
 
     def predict(self, inputs):
-        return [self.feedforward(inputs)]
+        """
+        Activate inputs through the network and return one row of outputs
+        per sample, like Keras models do.
+        """
+        return self.feedforward(np.atleast_2d(inputs))
 
     def backpropagate(self, inputs, wanted):
         """
         Backpropagate the error in one input/output sample to get cost gradients.
         """
-        hidden_zeta = np.dot(self.hidden_weights, inputs) + self.hidden_bias
+        return self.backpropagate_batch(np.atleast_2d(inputs), np.atleast_2d(wanted))
+
+    def backpropagate_batch(self, inputs, wanted, weights=None, active=None):
+        """
+        Backpropagate the errors in a batch of samples (one sample per row)
+        and return the cost gradients summed over the batch.
+        The samples may be weighted by an optional vector of weights.
+        If the indices of the active inputs are given, only those are used
+        and the hidden weight gradient has only their columns.
+        """
+        hidden_zeta = self.hidden_zeta(inputs, active)
         hidden_activated = ANN.sigmoid(hidden_zeta)
-        output_zeta = (np.dot(self.output_weights, hidden_activated)
+        output_zeta = (np.dot(hidden_activated, self.output_weights.T)
                        + self.output_bias)
         output_activated = ANN.sigmoid(output_zeta)
 
         delta_output = output_activated - wanted
-        delta_hidden = (np.dot(self.output_weights.T, delta_output)
+        if weights is not None:
+            delta_output *= weights[:, None]
+        delta_hidden = (np.dot(delta_output, self.output_weights)
                         * ANN.sigmoid_derivative(hidden_zeta))
 
-        output_cost_gradient_bias = delta_output
-        output_cost_gradient_weight = np.outer(delta_output, hidden_activated)
+        output_cost_gradient_bias = delta_output.sum(axis=0)
+        output_cost_gradient_weight = np.dot(delta_output.T, hidden_activated)
 
-        hidden_cost_gradient_bias = delta_hidden
-        hidden_cost_gradient_weight = np.outer(delta_hidden, inputs)
+        hidden_cost_gradient_bias = delta_hidden.sum(axis=0)
+        if active is None:
+            hidden_cost_gradient_weight = np.dot(delta_hidden.T, inputs)
+        else:
+            hidden_cost_gradient_weight = np.dot(delta_hidden.T, inputs[:, active])
 
         return [output_cost_gradient_bias, output_cost_gradient_weight,
                 hidden_cost_gradient_bias, hidden_cost_gradient_weight]
@@ -114,31 +158,39 @@ class ANN(object):
         self.train_minibatch([inputs], [wanted], learning_rate, regularization)
 
     def train_minibatch(self, inputs_batch, wanted_batch, learning_rate,
-                        regularization):
+                        regularization, weights=None):
         """
         Train the network with stochastic gradient descent (mini batch).
+        The batches may be lists of data vectors or matrices with one
+        sample per row. Optional sample weights scale the gradients,
+        e.g. importance weights from prioritized replay.
+        In the sparse mode, only the hidden weights of inputs that are
+        nonzero in the batch are updated.
         """
-
-        gradients = self.backpropagate(inputs_batch[0], wanted_batch[0])
-        for ii in range(1, len(inputs_batch)):
-            gradients1 = self.backpropagate(inputs_batch[ii], wanted_batch[ii])
-            for jj, grad in enumerate(gradients1):
-                gradients[jj] += grad
+        inputs_batch = np.asarray(inputs_batch)
+        active = ANN.active_inputs(inputs_batch) if self.sparse else None
+        gradients = self.backpropagate_batch(inputs_batch,
+                                             np.asarray(wanted_batch),
+                                             weights, active)
 
         self.output_bias -= learning_rate * gradients[0] / len(inputs_batch)
         # self.output_weights *= (1. - learning_rate * regularization)
         self.output_weights -= learning_rate * gradients[1] / len(inputs_batch)
         self.hidden_bias -= learning_rate * gradients[2] / len(inputs_batch)
         # self.hidden_weights *= (1. - learning_rate * regularization)
-        self.hidden_weights -= learning_rate * gradients[3] / len(inputs_batch)
+        if active is None:
+            self.hidden_weights -= learning_rate * gradients[3] / len(inputs_batch)
+        else:
+            self.hidden_weights[:, active] -= learning_rate * gradients[3] / len(inputs_batch)
 
     def train_set(self, inputs_set, wanted_set, learning_rate, regularization,
         epochs=1, mini_batch_size=None, n_samples_train=None):
         """
         Train the network with stochastic gradient descent.
         Arguments:
-        - inputs_set: a list of data vectors for the input layer
-        - wanted_set: a list of correct outputs data vector
+        - inputs_set: a list of data vectors for the input layer, or
+          a matrix or storage indexable by arrays of indices
+        - wanted_set: a list of correct outputs data vector, or as above
         - learning_rate: learning rate for the gradient descent method
         - regularization: the parameter in the regularization term
         - epochs: passes through the training set
@@ -155,7 +207,59 @@ class ANN(object):
             np.random.shuffle(rand_inds)
             for jj in range(0, n_samples_train, mini_batch_size):
                 inds = rand_inds[jj: jj+mini_batch_size]
-                inputs_batch = [inputs_set[ind] for ind in inds]
-                wanted_batch = [wanted_set[ind] for ind in inds]
+                inputs_batch = take(inputs_set, inds)
+                wanted_batch = take(wanted_set, inds)
                 self.train_minibatch(inputs_batch, wanted_batch,
                                      learning_rate, regularization/n_samples)
+
+    def get_params(self):
+        """
+        Return all weights and biases as one flat vector.
+        """
+        return np.concatenate((self.hidden_bias, self.hidden_weights.ravel(),
+                               self.output_bias, self.output_weights.ravel()))
+
+    def set_params(self, params):
+        """
+        Set all weights and biases from a flat vector given by get_params.
+        """
+        offset = 0
+        for values in [self.hidden_bias, self.hidden_weights,
+                       self.output_bias, self.output_weights]:
+            values.flat[:] = params[offset: offset+values.size]
+            offset += values.size
+
+    def save(self, filename):
+        """
+        Save the network weights and biases into a checkpoint file (.npz).
+        """
+        np.savez(filename,
+                 hidden_bias=self.hidden_bias,
+                 hidden_weights=self.hidden_weights,
+                 output_bias=self.output_bias,
+                 output_weights=self.output_weights)
+
+    def load(self, filename):
+        """
+        Load the network weights and biases from a checkpoint file
+        written by save. The network sizes must match.
+        """
+        with np.load(filename) as checkpoint:
+            if checkpoint['hidden_weights'].shape != self.hidden_weights.shape or \
+               checkpoint['output_weights'].shape != self.output_weights.shape:
+                raise ValueError("Checkpoint {} does not match network sizes {}".format(
+                                 filename, self.sizes))
+            self.hidden_bias = checkpoint['hidden_bias']
+            self.hidden_weights = checkpoint['hidden_weights']
+            self.output_bias = checkpoint['output_bias']
+            self.output_weights = checkpoint['output_weights']
+
+
+def take(samples, inds):
+    """
+    Pick the samples at the given indices from a list or from
+    anything that supports indexing with an array of indices.
+    """
+    if isinstance(samples, list):
+        return [samples[ind] for ind in inds]
+    return samples[inds]
@@ -0,0 +1,65 @@
+"""
+Shared cache of images and car sprites. Each image file is decoded once,
+and car sprites are painted once per color and rotated once per color
+and heading. The cached surfaces are shared, so they must not be drawn on.
+"""
+from math import pi
+
+import pygame
+
+import constants
+from view_table import N_HEADINGS
+
+_images = {}
+_car_sprites = {}
+_rotated_car_sprites = {}
+
+
+def image(filename, alpha=False):
+    """
+    Return the image in filename, converted to the display format.
+    """
+    key = (filename, alpha)
+    if key not in _images:
+        surface = pygame.image.load(filename)
+        _images[key] = surface.convert_alpha() if alpha else surface.convert()
+    return _images[key]
+
+
+def car_sprite(color):
+    """
+    Return the car sprite painted with the given color.
+    """
+    color = tuple(color)
+    if color not in _car_sprites:
+        car_sprite_pixelarray = pygame.PixelArray(image(constants.CAR_FILE, alpha=True).copy())
+        car_sprite_pixelarray.replace(constants.RED_ORIG_CAR, color, 0.1)
+        _car_sprites[color] = car_sprite_pixelarray.make_surface()
+        car_sprite_pixelarray.close()
+    return _car_sprites[color]
+
+
+def rotated_car_sprite(color, start_direction, turns):
+    """
+    Return the car sprite of the given color turned by a number of
+    TURN_SPEED steps from the start direction, with the background
+    transparent. The turns wrap around at a full circle, so there are
+    at most N_HEADINGS sprites per color and start direction.
+    """
+    turns = int(turns) % N_HEADINGS
+    key = (tuple(color), start_direction, turns)
+    if key not in _rotated_car_sprites:
+        angle = start_direction + turns * constants.TURN_SPEED - constants.CAR_IMAGE_ANGLE
+        sprite = pygame.transform.rotate(car_sprite(color), angle * 180 / pi)
+        sprite.set_colorkey(constants.BLACK)
+        _rotated_car_sprites[key] = sprite
+    return _rotated_car_sprites[key]
+
+
+def clear():
+    """
+    Forget all the cached surfaces, e.g. after changing the display mode.
+    """
+    _images.clear()
+    _car_sprites.clear()
+    _rotated_car_sprites.clear()
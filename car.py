@@ -1,7 +1,10 @@
 import pygame
 from math import sin, cos, pi, sqrt, asin
 
+import assets
 import constants
+import kernels
+from view_table import N_HEADINGS
 
 class Car(pygame.sprite.Sprite):
     """
@@ -20,6 +23,7 @@ class Car(pygame.sprite.Sprite):
         self.reset(0.)
 
         self.distance_total = 0.
+        self.progress_total = 0.  # distance along the track over all laps
         self.laps_total = 0
         self.lap_frame_best = 999999
         self.crashes = 0
@@ -29,14 +33,12 @@ class Car(pygame.sprite.Sprite):
 
     def _get_image(self):
         """
-        Load the car sprite and paint it.
+        Get the car sprite painted with the car's color.
+        The sprite is shared by all cars of the same color.
         """
-        self._car_sprite = pygame.image.load(constants.CAR_FILE).convert_alpha()
-        car_sprite_pixelarray = pygame.PixelArray(self._car_sprite)
-        car_sprite_pixelarray.replace(constants.RED_ORIG_CAR, self.color, 0.1)
-        self._car_sprite = car_sprite_pixelarray.make_surface()
+        self._car_sprite = assets.car_sprite(self.color)
         # self._car_sprite = pygame.transform.scale(self._car_sprite, (10, 15))
-        self.image = pygame.Surface(self._car_sprite.get_size()).convert_alpha()
+        self.image = self._car_sprite
 
     def init_controls(self):
         """
@@ -59,12 +61,12 @@ class Car(pygame.sprite.Sprite):
         self.laps = 0
         self.lap_frame = 0.
         self.lap_frame_prev = frame_counter
+        self.progress = 0.  # distance along the track on this lap
+        self.colliding = False  # see collide
         self.rect.center = self._start_position
         self.pos_x = self.rect.x  # pos_x is float, rect.x is int
         self.pos_y = self.rect.y
-        self.image = pygame.transform.rotate(self._car_sprite,
-                            (self._start_direction-constants.CAR_IMAGE_ANGLE) * 180 / pi)
-        # self.image.set_colorkey(constants.BLACK)
+        self.rotate_image()
 
     def update(self, track, frame_counter):
         """
@@ -72,88 +74,143 @@ class Car(pygame.sprite.Sprite):
         Checks if the car has gone off track etc.
         Updates the car's driver.
         """
-        if self.accelerate:
-            self.speed += constants.ACCELERATION
-        if self.brake:
-            self.speed -= constants.BRAKING
+        marks = track.swept(track.marks, *self.move())
+        if not self.check_marks(marks, track, frame_counter) and constants.CAR_COLLISIONS:
+            self.collide(track, frame_counter)
+        self.update_progress(track)
+
+        self.driver.look(self, track)
+        self.driver.update(self, frame_counter)
+
+    def move(self):
+        """
+        Turns and moves the car according to the controls.
+        Returns the segments (x0, y0, x1, y1) that the front corners and
+        the center moved along, for checking the track marks on the way.
+        """
         if self.turn_left:
             self.turn(constants.TURN_SPEED)
         if self.turn_right:
             self.turn(-constants.TURN_SPEED)
-        self.speed -= constants.FRICTION
-        if self.speed < 0.:
-            self.speed = 0.
+        # the checks are made along the whole move, not only where the
+        # car ends up, so that fast cars cannot skip over thin areas
+        corners_x, corners_y = self._corner_coordinates()
+        points_x = corners_x + [self.rect.center[0]]
+        points_y = corners_y + [self.rect.center[1]]
+        if kernels.ENABLED:
+            self.speed, self.pos_x, self.pos_y = kernels.car_step(
+                self.speed, self.pos_x, self.pos_y, self.direction,
+                self.accelerate, self.brake, constants.ACCELERATION,
+                constants.BRAKING, constants.FRICTION)
+        else:
+            if self.accelerate:
+                self.speed += constants.ACCELERATION
+            if self.brake:
+                self.speed -= constants.BRAKING
+            self.speed -= constants.FRICTION
+            if self.speed < 0.:
+                self.speed = 0.
+            self.pos_x += self.speed * cos(self.direction)
+            self.pos_y -= self.speed * sin(self.direction)  # pos down
 
         self.distance_total += self.speed
         self.distance_try += self.speed
-        self.pos_x += self.speed * cos(self.direction)
-        self.pos_y -= self.speed * sin(self.direction)  # pos down
         self.rect.x = int(self.pos_x)
         self.rect.y = int(self.pos_y)
 
-        if self.off_track(track):
+        corners_x, corners_y = self._corner_coordinates()
+        return (points_x, points_y,
+                corners_x + [self.rect.center[0]], corners_y + [self.rect.center[1]])
+
+    def check_marks(self, marks, track, frame_counter):
+        """
+        Handles the track marks passed by the segments from move.
+        Returns True if the car crashed.
+        """
+        if (marks[0] | marks[1]) & track.MARK_OFF_TRACK:  # front corners
             self.crash(frame_counter)
-        else:
-            self.passed_halfway(track)
-            self.passed_finish(track, frame_counter)
+            return True
+        # center
+        if marks[2] & track.MARK_HALFWAY:
+            self.passed_halfway()
+        if marks[2] & track.MARK_FINISH:
+            self.passed_finish(frame_counter)
+        return False
 
-        self.driver.look(self, track)
-        self.driver.update(self, frame_counter)
+    def update_progress(self, track):
+        """
+        Updates the car's progress along the track.
+        """
+        progress = track.lap_progress(*self.rect.center)
+        self.progress_total += track.progress_delta(self.progress, progress)
+        self.progress = progress
 
     def turn(self, angle):
         """
         Updates the car's direction angle and rotates the image.
         """
         self.direction += angle
-        self.image = pygame.transform.rotate(self._car_sprite,
-                            (self.direction - constants.CAR_IMAGE_ANGLE)*180/pi)
-        self.image.set_colorkey(constants.BLACK)
+        # keep the direction on the headings of the view table (see
+        # view_table.py), as TURN_SPEED does not divide the full circle exactly
+        self.direction = (self._start_direction
+                          + self.turns() * constants.TURN_SPEED)
+        self.rotate_image()
         self.rect = self.image.get_rect(center=self.rect.center)
         self.pos_x = self.rect.x + self.pos_x % 1  # include decimal part
         self.pos_y = self.rect.y + self.pos_y % 1
 
+    def rotate_image(self):
+        """
+        Sets the image to the car sprite rotated to the car's direction.
+        """
+        self.image = assets.rotated_car_sprite(self.color, self._start_direction,
+                                               self.turns())
+
+    def turns(self):
+        """
+        Returns the number of TURN_SPEED turns from the start direction
+        to the car's direction, within a full circle.
+        """
+        return int(round((self.direction - self._start_direction)
+                         / constants.TURN_SPEED)) % N_HEADINGS
+
     def get_corners(self):
         """
         Returns the coordinates corresponding to the front corners of the car.
         """
-        corners = []
+        return [[int(x), int(y)] for x, y in zip(*self._corner_coordinates())]
+
+    def _corner_coordinates(self):
+        """
+        Returns the exact x and y coordinates of the front corners as lists.
+        """
+        corners_x = []
+        corners_y = []
         for angle in [-self.center2corner_angle, self.center2corner_angle]:
-            x = self.rect.center[0] + self.half_diag * cos(self.direction+angle)
-            y = self.rect.center[1] - self.half_diag * sin(self.direction+angle)
-            corners.append([int(x), int(y)])
-        return corners
+            corners_x.append(self.rect.center[0] + self.half_diag * cos(self.direction+angle))
+            corners_y.append(self.rect.center[1] - self.half_diag * sin(self.direction+angle))
+        return corners_x, corners_y
 
-    def passed_halfway(self, track):
+    def passed_halfway(self):
         """
         Mark that the car has passed the halfway mark. Makes it impossible
         to finish by simply reversing at start.
         """
-        if track.track_mask.get_at(self.rect.center) == constants.COLOR_HALFWAY:
-            self.halfway = True
+        self.halfway = True
 
-    def passed_finish(self, track, frame_counter):
+    def passed_finish(self, frame_counter):
         """
         Called when car passes the finish line. Only laps
         that pass through the halfway mark are counted.
         """
-        if track.track_mask.get_at(self.rect.center) == constants.COLOR_FINISH:
-            if self.halfway:
-                self.laps += 1
-                self.laps_total += 1
-                self.lap_frame = frame_counter - self.lap_frame_prev
-                self.lap_frame_prev = frame_counter
-                self.lap_frame_best = min(self.lap_frame_best, self.lap_frame)
-                self.halfway = False
-                # print(self.name + ": FINISH!")
-
-    def off_track(self, track):
-        """
-        Check if the car is off track.
-        """
-        for point in self.get_corners():
-            if track.off_track(*point):
-                return True
-        return False
+        if self.halfway:
+            self.laps += 1
+            self.laps_total += 1
+            self.lap_frame = frame_counter - self.lap_frame_prev
+            self.lap_frame_prev = frame_counter
+            self.lap_frame_best = min(self.lap_frame_best, self.lap_frame)
+            self.halfway = False
+            # print(self.name + ": FINISH!")
 
     def crash(self, frame_counter):
         """
@@ -162,6 +219,25 @@ class Car(pygame.sprite.Sprite):
         self.crashes += 1
         self.reset(frame_counter)
 
+    def collide(self, track, frame_counter):
+        """
+        Check if the car hits other cars; both crash. After a reset the
+        car passes through other cars until it has once been clear of
+        all of them, since the start slots are closer than the cars are
+        wide.
+        """
+        others = [track.cars[index]
+                  for index in track.cars_near(self.rect.center[0], self.rect.center[1],
+                                               2. * constants.CAR_RADIUS, exclude=self)]
+        if not self.colliding:
+            self.colliding = not others
+            return
+        others = [other for other in others if other.colliding]
+        if others:
+            self.crash(frame_counter)
+            for other in others:
+                other.crash(frame_counter)
+
     def flip(self):
         """
         Flip car's direction.
@@ -23,6 +23,7 @@ WIDTH_SCREEN = WIDTH_TRACK + WIDTH_STATUS
 HEIGHT_SCREEN = HEIGHT_TRACK
 
 FRAME_RATE = 60
+MAX_STEPS_PER_FRAME = 128  # limit for fast forward
 
 CAR_FILE = "assets/car_red.png"
 TRACK_FILE = "assets/track2_show.png"
@@ -34,12 +35,24 @@ ACCELERATION = 0.025
 FRICTION = 0.015
 BRAKING = 0.1
 
+CAR_COLLISIONS = False  # cars crash into each other
+CARS_VISIBLE = False  # cars see each other in their view fields
+CAR_RADIUS = 9.  # cars are circles in collisions and views
+CAR_GRID_CELL = 25.  # cell size of the grid for finding nearby cars
+
 MIN_VIEW_DISTANCE = 40.
 MAX_VIEW_DISTANCE = 150.
 VIEW_RESOLUTION = (5,4)
 VIEW_ANGLE = 120.
 
 BLOCK_VIEW = True
+VIEW_TABLE = False  # look up view fields from a table built by view_table.py
 ALWAYS_FULLGAS = False
 PLOT_ERROR = False
 PLOT_ERROR_INTERVAL = FRAME_RATE * 6
+
+ANN_CLONES = 0  # extra cars sharing the ANN_Online network
+
+DATASET_DIR = "recordings/demonstration"
+TELEMETRY_FILE = None  # e.g. "telemetry/run.tlm", replay with telemetry_viewer.py
+CACHE_DIR = "cache"
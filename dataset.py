@@ -0,0 +1,149 @@
+import json
+import os
+import queue
+import threading
+
+import numpy as np
+
+
+INFO_FILE = "info.json"
+INPUTS_FILE = "inputs.f4"
+OUTPUTS_FILE = "outputs.f4"
+
+
+class Recorder(object):
+    """
+    This class records demonstration samples (network inputs and the
+    wanted outputs) into a dataset directory. Samples are appended to
+    raw float32 files, so recordings of any length can later be read
+    back as memory maps by Dataset.
+    """
+    def __init__(self, path, n_inputs, n_outputs, buffer_size=1000):
+        self.path = path
+        self.n_inputs = n_inputs
+        self.n_outputs = n_outputs
+        if not os.path.isdir(path):
+            os.makedirs(path)
+
+        info_file = os.path.join(path, INFO_FILE)
+        if os.path.exists(info_file):
+            with open(info_file) as info:
+                sizes = json.load(info)
+            if (sizes['n_inputs'], sizes['n_outputs']) != (n_inputs, n_outputs):
+                raise ValueError("Dataset {} has sizes ({}, {}), not ({}, {})".format(
+                                 path, sizes['n_inputs'], sizes['n_outputs'],
+                                 n_inputs, n_outputs))
+        else:
+            with open(info_file, 'w') as info:
+                json.dump({'n_inputs': n_inputs, 'n_outputs': n_outputs}, info)
+
+        self._inputs = np.empty((buffer_size, n_inputs), dtype=np.float32)
+        self._outputs = np.empty((buffer_size, n_outputs), dtype=np.float32)
+        self._n_buffered = 0
+
+    def record(self, inputs, outputs):
+        """
+        Add one sample. The sample is written to disk when the buffer fills.
+        """
+        self._inputs[self._n_buffered] = np.ravel(inputs)
+        self._outputs[self._n_buffered] = np.ravel(outputs)
+        self._n_buffered += 1
+        if self._n_buffered == len(self._inputs):
+            self.flush()
+
+    def record_model(self, learner):
+        """
+        Add the current sample of the model car followed by a learning driver.
+        """
+        self.record(learner.prepare_inputs(learner.model_car),
+                    learner.model_actions())
+
+    def flush(self):
+        """
+        Write the buffered samples to disk.
+        """
+        if self._n_buffered == 0:
+            return
+        with open(os.path.join(self.path, INPUTS_FILE), 'ab') as inputs_file:
+            self._inputs[:self._n_buffered].tofile(inputs_file)
+        with open(os.path.join(self.path, OUTPUTS_FILE), 'ab') as outputs_file:
+            self._outputs[:self._n_buffered].tofile(outputs_file)
+        self._n_buffered = 0
+
+
+class Dataset(object):
+    """
+    This class gives read-only access to a recorded dataset.
+    The samples are memory mapped, so only the parts actually
+    used are read into memory.
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(os.path.join(path, INFO_FILE)) as info:
+            sizes = json.load(info)
+        self.n_inputs = sizes['n_inputs']
+        self.n_outputs = sizes['n_outputs']
+        for filename in [INPUTS_FILE, OUTPUTS_FILE]:
+            filename = os.path.join(path, filename)
+            if not os.path.exists(filename) or os.path.getsize(filename) == 0:
+                raise ValueError("Dataset {} has no samples".format(path))
+        self.inputs = np.memmap(os.path.join(path, INPUTS_FILE),
+                                dtype=np.float32, mode='r').reshape(-1, self.n_inputs)
+        self.outputs = np.memmap(os.path.join(path, OUTPUTS_FILE),
+                                 dtype=np.float32, mode='r').reshape(-1, self.n_outputs)
+        if len(self.inputs) != len(self.outputs):
+            raise ValueError("Dataset {} has {} inputs but {} outputs".format(
+                             path, len(self.inputs), len(self.outputs)))
+
+    def __len__(self):
+        return len(self.inputs)
+
+    def batches(self, mini_batch_size, epochs=1, prefetch=4):
+        """
+        Iterate over shuffled mini batches of (inputs, outputs) as float
+        matrices. The batches are assembled by a background thread that
+        keeps up to prefetch batches ready.
+        """
+        batch_queue = queue.Queue(maxsize=prefetch)
+        stop = threading.Event()
+        worker = threading.Thread(target=self._assemble_batches,
+                                  args=(batch_queue, stop, mini_batch_size, epochs))
+        worker.daemon = True
+        worker.start()
+        try:
+            while True:
+                batch = batch_queue.get()
+                if batch is None:
+                    break
+                if isinstance(batch, Exception):  # raised by the worker
+                    raise batch
+                yield batch
+        finally:
+            stop.set()
+            # unblock the worker if it is waiting on a full queue
+            while worker.is_alive():
+                try:
+                    batch_queue.get(timeout=0.1)
+                except queue.Empty:
+                    pass
+
+    def _assemble_batches(self, batch_queue, stop, mini_batch_size, epochs):
+        """
+        Worker for batches: gathers the shuffled samples from the memory maps.
+        An error is passed on through the queue instead of a batch.
+        """
+        try:
+            rand_inds = np.arange(len(self))
+            for ii in range(epochs):
+                np.random.shuffle(rand_inds)
+                for jj in range(0, len(self), mini_batch_size):
+                    if stop.is_set():
+                        return
+                    # sorted indices keep the reads from the memory maps sequential
+                    inds = np.sort(rand_inds[jj: jj+mini_batch_size])
+                    batch_queue.put((self.inputs[inds].astype(float),
+                                     self.outputs[inds].astype(float)))
+        except Exception as error:
+            batch_queue.put(error)
+            return
+        batch_queue.put(None)
@@ -3,6 +3,9 @@ import pygame
 
 import constants
 import ann
+import kernels
+import observations
+import replay_memory
 
 
 class Driver(object):
@@ -30,23 +33,36 @@ class Driver(object):
         self.view_angles = np.linspace(-self.view_angle/2.,
                                        self.view_angle/2.,
                                        self.view_resolution[0]) * np.pi/180.
-        self.view_x = np.empty(self.view_resolution)
-        self.view_y = np.empty(self.view_resolution)
+        self.view_x = np.zeros(self.view_resolution, dtype=int)
+        self.view_y = np.zeros(self.view_resolution, dtype=int)
         self.view_field = np.zeros(self.view_resolution)
+        self._view_pose = None  # set if the view coordinates are not up to date
 
     def look(self, car, track):
         """
         Evaluate the driver's view ahead.
         """
-        cos_angles = np.cos(car.direction + self.view_angles)
-        self.view_x = (car.rect.center[0]
-                       + np.outer(cos_angles, self.view_distances)
-                       ).astype(int)
+        if constants.VIEW_TABLE:
+            # the view coordinates are only needed for drawing
+            self._view_pose = (car.rect.center, car.direction)
+            self.view_field.flat[:] = track.view_table(self).lookup(
+                car.rect.center[0], car.rect.center[1], car.direction)
+        elif kernels.ENABLED:
+            kernels.look(track.off_track_map, car.rect.center[0], car.rect.center[1],
+                         car.direction, self.view_angles, self.view_distances,
+                         constants.BLOCK_VIEW, self.view_x, self.view_y,
+                         self.view_field)
+        else:
+            self._look_numpy(car, track)
+        if constants.CARS_VISIBLE:
+            self.see_cars(car, track)
 
-        sin_angles = np.sin(car.direction + self.view_angles)
-        self.view_y = (car.rect.center[1]
-                       - np.outer(sin_angles, self.view_distances)
-                      ).astype(int)
+    def _look_numpy(self, car, track):
+        """
+        Evaluate the driver's view ahead with NumPy.
+        """
+        self.view_x, self.view_y = self._view_coordinates(car.rect.center,
+                                                          car.direction)
 
         # limit coordinates within track area (only for checking if off track)
         x_matrix0 = np.where((self.view_x < 0) |
@@ -65,10 +81,49 @@ class Driver(object):
                 if np.any(lineview):
                     lineview[np.argmax(lineview):] = 1
 
+    def see_cars(self, car, track):
+        """
+        Mark the view points on other cars like off track points,
+        so that the other cars are seen as obstacles.
+        """
+        others = track.cars_near(car.rect.center[0], car.rect.center[1],
+                                 self.view_distance + constants.CAR_RADIUS, exclude=car)
+        if len(others) == 0:
+            return
+        if self._view_pose is not None:
+            view_x, view_y = self._view_coordinates(*self._view_pose)
+        else:
+            view_x, view_y = self.view_x, self.view_y
+        centers = track.car_centers[others]
+        seen = np.any((view_x[..., None] - centers[:, 0])**2
+                      + (view_y[..., None] - centers[:, 1])**2
+                      < constants.CAR_RADIUS**2, axis=-1)
+        if constants.BLOCK_VIEW:  # block the view behind the cars
+            seen = np.logical_or.accumulate(seen, axis=1)
+        self.view_field[seen] = 1.
+
+    def _view_coordinates(self, center, direction):
+        """
+        Return the x and y coordinates of the view points.
+        """
+        cos_angles = np.cos(direction + self.view_angles)
+        view_x = (center[0]
+                  + np.outer(cos_angles, self.view_distances)
+                  ).astype(int)
+
+        sin_angles = np.sin(direction + self.view_angles)
+        view_y = (center[1]
+                  - np.outer(sin_angles, self.view_distances)
+                 ).astype(int)
+        return view_x, view_y
+
     def draw_viewfield(self, screen):
         """
         Draw the field of view.
         """
+        if self._view_pose is not None:
+            self.view_x, self.view_y = self._view_coordinates(*self._view_pose)
+            self._view_pose = None
         for xx, yy, colind in zip(self.view_x.flatten(),
                                   self.view_y.flatten(),
                                   self.view_field.flatten()):
@@ -80,6 +135,14 @@ class Driver(object):
         """
         car.init_controls()
 
+    def restored(self, car):
+        """
+        Called when the car has been set back to a snapshot (see
+        snapshot.py), so that drivers can drop state that refers to
+        the time before.
+        """
+        pass
+
 
 class Player(Driver):
     """
@@ -105,6 +168,19 @@ class Player(Driver):
             car.turn_right = True
 
 
+class External(Driver):
+    """
+    This class implements a driver controlled from outside the car,
+    e.g. by an environment stepping cars for a learning algorithm.
+    The controls are left as they were set.
+    """
+    def __init__(self, *args, **kwargs):
+        super(External, self).__init__(*args, **kwargs)
+
+    def update(self, car, frame_counter, *args):
+        pass
+
+
 class AI_TIF(Driver):
     """
     This class implements a simple AI driver that tries to keep most of
@@ -149,31 +225,47 @@ class ANN_Online(Driver):
                  learning_rate=0.2,
                  regularization=1.,
                  use_keras=False,
+                 checkpoint=None,
+                 network=None,
+                 batcher=None,
+                 sparse_inputs=False,
                  *args, **kwargs):
         super(ANN_Online, self).__init__(*args, **kwargs)
-        self.model_car = model_car  # the car to learn from
+        self.model_car = model_car  # the car to learn from, if any
         self.learning_rate = learning_rate
         self.regularization = regularization
         self.use_keras = use_keras
+        self.batcher = batcher  # for evaluating the network with other drivers
 
-        n_inputs = self.view_resolution[0] * self.view_resolution[1] + 1  # viewpoints + speed
-        n_outputs = 4  # accelerate, brake, left, right
+        self.n_inputs = self.view_resolution[0] * self.view_resolution[1] + 1  # viewpoints + speed
+        self.n_outputs = 4  # accelerate, brake, left, right
 
-        if self.use_keras:
-            self.ann = ann.create_ANN_Keras(n_inputs, n_hidden_neurons, n_outputs)
+        if network is not None:  # shared with other drivers
+            self.ann = network
+        elif self.use_keras:
+            self.ann = ann.create_ANN_Keras(self.n_inputs, n_hidden_neurons, self.n_outputs)
         else:
-            self.ann = ann.ANN(n_inputs, n_hidden_neurons, n_outputs)
+            # the view field inputs are mostly zeros at high resolutions
+            self.ann = ann.ANN(self.n_inputs, n_hidden_neurons, self.n_outputs,
+                               sparse=sparse_inputs)
+            if checkpoint is not None:  # e.g. trained offline with train_offline.py
+                self.ann.load(checkpoint)
 
     def update(self, own_car, frame_counter, *args):
         super(ANN_Online, self).update(own_car, frame_counter, *args)
 
-        if constants.PLOT_ERROR:
-            self.evaluate_error()
+        if self.model_car is not None:
+            if constants.PLOT_ERROR:
+                self.evaluate_error()
+            self.learn()
 
-        self.learn()
         inputs = self.prepare_inputs(own_car)
-        outputs = self.ann.feedforward(inputs)
-        self.process_output(outputs, own_car)
+        if self.batcher is not None:
+            self.batcher.submit(self.ann, inputs,
+                                lambda outputs: self.process_output(outputs, own_car))
+        else:
+            outputs = self.ann.feedforward(inputs)
+            self.process_output(outputs, own_car)
 
     def learn(self):
         model_inputs = self.prepare_inputs(self.model_car)
@@ -263,8 +355,10 @@ class ANN_Batch(ANN_Online):
         self.reset_samples()
 
     def reset_samples(self):
-        self.input_samples = []
-        self.output_samples = []
+        # the samples are binary except for the speed, so store them bit-packed
+        self.input_samples = observations.Packed_observations(self.n_inputs)
+        self.output_samples = observations.Packed_observations(self.n_outputs,
+                                                                n_floats=0)
 
 
 class ReinforcedLearner(ANN_Online):
@@ -281,8 +375,11 @@ class ReinforcedLearner(ANN_Online):
                  mini_batch_size=50,
                  learning_rate=0.2,
                  regularization=0.1,
+                 prioritized=False,
                  *args, **kwargs):
-        super(ReinforcedLearner, self).__init__(*args, **kwargs)
+        super(ReinforcedLearner, self).__init__(learning_rate=learning_rate,
+                                                regularization=regularization,
+                                                *args, **kwargs)
         self.discount = discount
         self.prob_random = 1.  # initial probability of chooosing random action
         self.skip_frames = 5
@@ -293,9 +390,14 @@ class ReinforcedLearner(ANN_Online):
             self.prev_state = self.prev_state[None, :]
         self.qval = self.ann.predict(self.prev_state)[0]
         self.action = 1  # brake, since car at start which gives neg. reward
+        self.reward = 0.
+        self.progress_total_prev = 0.  # car's progress along the track at previous action
 
         self.n_memories = n_memories
-        self.memories = []  # prev_state, action, new_state, reward
+        if prioritized:  # replay surprising transitions, e.g. crashes, more often
+            self.memories = replay_memory.Prioritized_replay(n_memories, self.n_inputs)
+        else:
+            self.memories = replay_memory.Replay_memory(n_memories, self.n_inputs)
         self.mini_batch_size = mini_batch_size
 
     def update(self, own_car, frame_counter, *args):
@@ -307,54 +409,38 @@ class ReinforcedLearner(ANN_Online):
 
         # get reward from previous action
         reward = self.get_reward(own_car, frame_counter)
-        print('reward {:.2f}, prob {:.2f}'.format(reward, self.prob_random))
+        self.reward = reward  # for inspection; see also telemetry.py
+        self.progress_total_prev = own_car.progress_total
 
         new_state = self.prepare_inputs(own_car)
-        self.memories.append([self.prev_state, self.action, new_state, reward])
-
-        # remove too old memories
-        if len(self.memories) > self.n_memories:
-            self.memories.pop(0)
+        self.memories.add(self.prev_state, self.action, new_state, reward)
 
         # select memories to train on
-        sel_inds = np.random.choice(len(self.memories),
-                                    min(len(self.memories), self.mini_batch_size),
-                                    replace=False)
-
-        inputs = []
-        targets = []
-        for ind in sel_inds:
-            prev_state = self.memories[ind][0]
-            action = self.memories[ind][1]
-            new_state = self.memories[ind][2]
-            reward = self.memories[ind][3]
-
-            target = self.ann.predict(prev_state)[0]  # Q for previous state
-            new_Q = self.ann.predict(new_state)[0]  # Q for new state after move
-            target[action] += reward #- self.learning_rate * target[action]
-            if not np.isclose(reward, -10):  # check for terminal state
-                target[action] += self.discount * np.max(new_Q)
-                # target[action] += self.learning_rate * self.discount * np.max(new_Q)
-
-            inputs.append(prev_state)
-            targets.append(target)
+        sel_inds, weights = self.memories.sample(self.mini_batch_size)
+        prev_states = self.memories.prev_states[sel_inds]
+        actions = self.memories.actions[sel_inds]
+        rewards = self.memories.rewards[sel_inds]
+        rows = np.arange(len(sel_inds))
+
+        targets = np.array(self.ann.predict(prev_states))  # Q for previous states
+        new_Q = self.ann.predict(self.memories.new_states[sel_inds])  # Q for new states after move
+        not_terminal = ~np.isclose(rewards, -10)  # check for terminal state
+        td_errors = rewards + not_terminal * self.discount * np.max(new_Q, axis=1)
+        targets[rows, actions] += td_errors
+        self.memories.update_priorities(sel_inds, td_errors)
 
         if self.use_keras:
-            self.ann.fit(np.array(inputs), np.array(targets), batch_size=len(inputs), nb_epoch=1, verbose=0)
+            self.ann.fit(prev_states, targets, batch_size=len(sel_inds), nb_epoch=1,
+                         verbose=0, sample_weight=weights)
         else:
-            self.ann.train_set(inputs, targets, self.learning_rate, self.regularization)
-
-        new_state = self.memories[-1][2]
-        self.qval = self.ann.predict(new_state)[0]
+            self.ann.train_minibatch(prev_states, targets, self.learning_rate,
+                                     self.regularization / len(sel_inds), weights)
 
-        # choose action
-        if self.prob_random > np.random.rand():
-            self.action = np.random.randint(0, 4)
+        if self.batcher is not None:
+            self.batcher.submit(self.ann, new_state,
+                                lambda qval: self.act(qval, own_car))
         else:
-            self.action = np.argmax(self.qval)
-
-        # set car controls according to the chosen action
-        self.process_output(np.eye(1, 4, self.action)[0], own_car)
+            self.act(self.ann.predict(new_state)[0], own_car)
         self.prev_state = new_state
 
         # decrease randomness over time
@@ -364,6 +450,29 @@ class ReinforcedLearner(ANN_Online):
         if constants.PLOT_ERROR:
             self.evaluate_error()
 
+    def act(self, qval, own_car):
+        """
+        Choose the action given the Q values of the new state and
+        set the car controls accordingly.
+        """
+        self.qval = qval
+        if self.prob_random > np.random.rand():
+            self.action = np.random.randint(0, 4)
+        else:
+            self.action = np.argmax(self.qval)
+        self.process_output(np.eye(1, 4, self.action)[0], own_car)
+
+    def restored(self, car):
+        """
+        Continue learning from the restored state, so that the next
+        memory does not span the jump in time.
+        """
+        self.prev_state = self.prepare_inputs(car)
+        controls = [car.accelerate, car.brake, car.turn_left, car.turn_right]
+        if any(controls):
+            self.action = int(np.argmax(controls))
+        self.progress_total_prev = car.progress_total
+
     def get_reward(self, own_car, frame_counter):
         # check if car just hit a wall and was reset to beginning
         if own_car.lap_frame_prev >= frame_counter - self.skip_frames:
@@ -376,4 +485,7 @@ class ReinforcedLearner(ANN_Online):
             # return clearness * (own_car.speed) * 2
             # return clearness * (own_car.speed + constants.ACCELERATION) * 5
             # return own_car.distance_try
-            return own_car.speed - constants.ACCELERATION
+            # return own_car.speed - constants.ACCELERATION
+            # progress along the track, so that driving backwards does not pay
+            return ((own_car.progress_total - self.progress_total_prev) / self.skip_frames
+                    - constants.ACCELERATION)
@@ -0,0 +1,157 @@
+import itertools
+import os
+
+import numpy as np
+import pygame
+
+from car import Car
+import driver
+from track import Track
+import constants
+
+CAR_COLORS = (constants.RED, constants.GREEN, constants.BLUE,
+              constants.YELLOW, constants.CYAN)
+REWARD_CRASH = -10.
+
+
+def init_headless():
+    """
+    Prepare pygame for running without a window, unless a display is
+    already open. Loading the track and car images needs a display mode.
+    """
+    if pygame.display.get_init() and pygame.display.get_surface() is not None:
+        return
+    os.environ.setdefault("SDL_VIDEODRIVER", "dummy")
+    pygame.display.init()
+    pygame.display.set_mode((1, 1))
+
+
+class Vector_env(object):
+    """
+    This class implements a gym-style environment that steps a number of
+    cars in lockstep. Observations, rewards and done flags are returned
+    as arrays with one row per car, and actions are given as an array of
+    action indices (0 = accelerate, 1 = brake, 2 = left, 3 = right), as
+    used by ReinforcedLearner.
+
+    The returned arrays are owned by the environment and overwritten on
+    the next step. A car that crashes is reset to start automatically;
+    its done flag is set and the observation is from the new start.
+    """
+    n_actions = 4
+
+    def __init__(self, n_cars, action_repeat=1, track=None,
+                 first_slot=0, n_slots=None, buffers=None, **driver_kwargs):
+        """
+        Arguments:
+        - n_cars: number of cars in this environment
+        - action_repeat: number of frames each action is applied for
+        - track: the Track to drive on; loaded if not given
+        - first_slot, n_slots: the cars take start slots first_slot...
+          out of n_slots on the start line (default: n_cars slots)
+        - buffers: optional (observations, rewards, dones) arrays to use
+        - driver_kwargs: view settings for the drivers
+        """
+        init_headless()
+        self.n_cars = n_cars
+        self.action_repeat = action_repeat
+        self.track = track if track is not None else Track()
+        self.frame_counter = 0
+
+        if n_slots is None:
+            n_slots = n_cars
+        start_position, start_direction = self.track.find_start(n_slots)
+        self.cars = []
+        for ii in range(n_cars):
+            slot = first_slot + ii
+            self.cars.append(Car("Agent {}".format(slot),
+                                 CAR_COLORS[slot % len(CAR_COLORS)],
+                                 start_position[slot], start_direction,
+                                 driver.External(**driver_kwargs)))
+
+        view_resolution = self.cars[0].driver.view_resolution
+        self.n_inputs = view_resolution[0] * view_resolution[1] + 1  # viewpoints + speed
+        if buffers is None:
+            buffers = (np.zeros((n_cars, self.n_inputs)),
+                       np.zeros(n_cars),
+                       np.zeros(n_cars, dtype=bool))
+        self.observations, self.rewards, self.dones = buffers
+
+    def reset(self):
+        """
+        Reset all cars back to start and return the observations.
+        """
+        for car in self.cars:
+            car.reset(self.frame_counter)
+            car.driver.look(car, self.track)
+        self._observe()
+        self.dones[:] = False
+        return self.observations
+
+    def step(self, actions):
+        """
+        Apply the actions to the cars for action_repeat frames.
+        Returns the observations, rewards and done flags.
+        """
+        crashes_prev = [car.crashes for car in self.cars]
+        progress_prev = [car.progress_total for car in self.cars]
+        for ii in range(self.action_repeat):
+            if constants.CAR_COLLISIONS or constants.CARS_VISIBLE:
+                self.track.update_cars(self.cars)
+            for car, action in zip(self.cars, actions):
+                set_controls(car, action)
+            self._update_cars()
+            self.frame_counter += 1
+
+        for ii, car in enumerate(self.cars):
+            self.dones[ii] = car.crashes > crashes_prev[ii]
+            if self.dones[ii]:
+                self.rewards[ii] = REWARD_CRASH
+            else:  # same reward as in ReinforcedLearner
+                self.rewards[ii] = ((car.progress_total - progress_prev[ii]) / self.action_repeat
+                                    - constants.ACCELERATION)
+        self._observe()
+        return self.observations, self.rewards, self.dones
+
+    def _update_cars(self):
+        """
+        Update all cars for one frame as in Car.update, but check the
+        track marks along the moves of all cars at once.
+        """
+        segments = [car.move() for car in self.cars]
+        x0, y0, x1, y1 = [list(itertools.chain(*coordinates)) for coordinates in zip(*segments)]
+        marks = self.track.swept(self.track.marks, x0, y0, x1, y1)
+        crashed = [car.check_marks(marks[3*ii: 3*ii+3], self.track, self.frame_counter)
+                   for ii, car in enumerate(self.cars)]
+        if constants.CAR_COLLISIONS:
+            for car, car_crashed in zip(self.cars, crashed):
+                if not car_crashed:
+                    car.collide(self.track, self.frame_counter)
+        for car in self.cars:
+            car.update_progress(self.track)
+            car.driver.look(car, self.track)
+            car.driver.update(car, self.frame_counter)
+
+    def _observe(self):
+        """
+        Fill in the observations: speed transform and view field, as in
+        ANN_Online.prepare_inputs.
+        """
+        for ii, car in enumerate(self.cars):
+            self.observations[ii, 0] = 1. / max(car.speed, 1.)
+            self.observations[ii, 1:] = car.driver.view_field.ravel()
+
+
+def set_controls(car, action):
+    """
+    Set the car controls according to an action index.
+    """
+    car.init_controls()
+    if action == 0:
+        car.accelerate = True
+    elif action == 1:
+        car.brake = True
+    elif action == 2:
+        car.turn_left = True
+    elif action == 3:
+        car.turn_right = True
@@ -5,6 +5,10 @@ import driver
 from track import Track
 from statusbar import Status_bar
 from plot_error import Error_plot
+from dataset import Recorder
+from snapshot import take_snapshot, restore_snapshot
+from telemetry import Telemetry_writer
+from inference import Inference_batcher
 import constants
 
 # init stuff
@@ -13,6 +17,9 @@ clock = pygame.time.Clock()
 done = False
 draw_viewfield = False
 learn_from_player = False
+recorder = None
+saved_state = None
+steps_per_frame = 1  # simulation steps per displayed frame, for fast forward
 
 screen = pygame.display.set_mode((constants.WIDTH_SCREEN,
                                   constants.HEIGHT_SCREEN))
@@ -25,8 +32,10 @@ player_car = Car("Player", constants.BLUE, start_position[0], start_direction,
                  driver.Player())
 ai_tif_car = Car("AI_TIF", constants.YELLOW, start_position[3], start_direction,
                  driver.AI_TIF())
+inference_batcher = Inference_batcher()
 ann_online_car = Car("ANN_Online", constants.RED, start_position[2],
-                     start_direction, driver.ANN_Online(model_car=ai_tif_car))
+                     start_direction, driver.ANN_Online(model_car=ai_tif_car,
+                                                        batcher=inference_batcher))
 ann_batch_car = Car("ANN_Batch", constants.GREEN, start_position[1],
                     start_direction, driver.ANN_Batch(model_car=ai_tif_car))
 rl_car = Car("RLearner", constants.CYAN, start_position[-1],
@@ -41,12 +50,24 @@ for car in [player_car, ann_online_car, ann_batch_car, ai_tif_car, rl_car]:
     car_list.add(car)
     sprite_list.add(car)
 
-status_bar = Status_bar(car_list)
+status_bar = Status_bar(car_list.sprites())
+
+# clones driving with the ANN_Online network, evaluated in one batch
+for ii in range(constants.ANN_CLONES):
+    clone_car = Car("ANN_Online clone", constants.RED, start_position[2],
+                    start_direction,
+                    driver.ANN_Online(network=ann_online_car.driver.ann,
+                                      batcher=inference_batcher))
+    car_list.add(clone_car)
+    sprite_list.add(clone_car)
 sprite_list.add(status_bar)
 
 if constants.PLOT_ERROR:
     error_plot = Error_plot([ann_online_car, ann_batch_car, rl_car])
 
+if constants.TELEMETRY_FILE:
+    telemetry = Telemetry_writer(constants.TELEMETRY_FILE, car_list)
+
 frame_counter = 0
 
 while not done:
@@ -68,6 +89,27 @@ while not done:
                 ann_batch_car.driver.reset_samples()
             elif event.key == pygame.K_t:
                 ann_batch_car.driver.train()
+            elif event.key == pygame.K_d:
+                # toggle recording the model car for offline training
+                if recorder is None:
+                    recorder = Recorder(constants.DATASET_DIR,
+                                        ann_batch_car.driver.n_inputs,
+                                        ann_batch_car.driver.n_outputs)
+                else:
+                    recorder.flush()
+                    recorder = None
+            elif event.key == pygame.K_s:
+                saved_state = take_snapshot(car_list.sprites(), frame_counter)
+            elif event.key == pygame.K_b and saved_state is not None:
+                # back to the saved state, e.g. to replay a crash
+                frame_counter = restore_snapshot(saved_state, car_list.sprites())
+            elif event.key in (pygame.K_PLUS, pygame.K_KP_PLUS, pygame.K_EQUALS):
+                steps_per_frame = min(2 * steps_per_frame,
+                                      constants.MAX_STEPS_PER_FRAME)
+                pygame.display.set_caption("FormulaAI x{}".format(steps_per_frame))
+            elif event.key in (pygame.K_MINUS, pygame.K_KP_MINUS):
+                steps_per_frame = max(steps_per_frame // 2, 1)
+                pygame.display.set_caption("FormulaAI x{}".format(steps_per_frame))
             elif event.key == pygame.K_p:
                 paused = True
                 while paused:
@@ -77,8 +119,19 @@ while not done:
                                 paused = False
                     clock.tick(constants.FRAME_RATE)  # fps
 
-    # update game status and handle game logic
-    car_list.update(track, frame_counter)
+    # update game status and handle game logic; when fast forwarding,
+    # only the last step of the frame is shown
+    for step in range(steps_per_frame):
+        if step > 0:
+            frame_counter += 1
+        if constants.CAR_COLLISIONS or constants.CARS_VISIBLE:
+            track.update_cars(car_list)
+        car_list.update(track, frame_counter)
+        inference_batcher.flush()  # sets the controls of the batched drivers
+        if recorder is not None:
+            recorder.record_model(ann_batch_car.driver)
+        if constants.TELEMETRY_FILE:
+            telemetry.record(frame_counter)
     status_bar.update(frame_counter)
 
     # update draw buffer
@@ -98,4 +151,8 @@ while not done:
     pygame.display.flip()
 
 
+if recorder is not None:
+    recorder.flush()
+if constants.TELEMETRY_FILE:
+    telemetry.close()
 pygame.quit()
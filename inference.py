@@ -0,0 +1,32 @@
+import numpy as np
+
+
+class Inference_batcher(object):
+    """
+    This class collects the inputs of drivers that share a network during
+    a frame and evaluates them with one forward pass per network. Each
+    driver gets its outputs through its callback when flush is called,
+    which has to happen before the cars are updated again.
+    """
+    def __init__(self):
+        self._requests = {}  # network id: network, inputs, callbacks
+
+    def submit(self, network, inputs, callback):
+        """
+        Queue inputs (one sample) for the network. The callback is called
+        with the corresponding outputs.
+        """
+        request = self._requests.setdefault(id(network), (network, [], []))
+        request[1].append(np.ravel(inputs))
+        request[2].append(callback)
+
+    def flush(self):
+        """
+        Evaluate the queued inputs and hand the outputs to the drivers.
+        """
+        requests = self._requests
+        self._requests = {}
+        for network, inputs, callbacks in requests.values():
+            outputs = network.predict(np.array(inputs))
+            for output, callback in zip(outputs, callbacks):
+                callback(output)
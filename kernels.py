@@ -0,0 +1,175 @@
+"""
+Optional Numba-compiled kernels for the inner loops of the simulation:
+car stepping, swept track mark checks and view field sampling.
+
+The kernels are used automatically when Numba is installed (ENABLED);
+otherwise the cars and drivers use their NumPy implementations.
+Run this module to check that both give the same results:
+
+    python kernels.py
+"""
+from math import sin, cos
+
+import numpy as np
+
+try:
+    import numba
+except ImportError:
+    numba = None
+
+ENABLED = numba is not None
+
+
+def _jit(func):
+    """
+    Compile the function with Numba if available. Without Numba the
+    plain Python function is kept, so that it can still be checked.
+    """
+    if numba is None:
+        return func
+    return numba.njit(cache=True)(func)
+
+
+@_jit
+def car_step(speed, pos_x, pos_y, direction, accelerate, brake,
+             acceleration, braking, friction):
+    """
+    Update the car's speed and position for one frame, as in Car.update.
+    Returns the new speed and position.
+    """
+    if accelerate:
+        speed += acceleration
+    if brake:
+        speed -= braking
+    speed -= friction
+    if speed < 0.:
+        speed = 0.
+    pos_x += speed * cos(direction)
+    pos_y -= speed * sin(direction)  # pos down
+    return speed, pos_x, pos_y
+
+
+@_jit
+def swept_marks(marks, x0, y0, x1, y1):
+    """
+    Collect the marks that the line segments from (x0, y0) to (x1, y1)
+    pass over, as in Track.swept.
+    """
+    width, height = marks.shape
+    passed = np.zeros(len(x0), dtype=marks.dtype)
+    length = 0.
+    for ii in range(len(x0)):
+        length = max(length, abs(x1[ii] - x0[ii]), abs(y1[ii] - y0[ii]))
+    n_points = int(np.ceil(length)) + 1
+    step = 1. / (n_points - 1) if n_points > 1 else 0.
+    for ii in range(len(x0)):
+        for jj in range(n_points):
+            fraction = jj * step if jj < n_points - 1 else 1.
+            x = int(x0[ii] * (1. - fraction) + x1[ii] * fraction)
+            y = int(y0[ii] * (1. - fraction) + y1[ii] * fraction)
+            x = min(max(x, 0), width - 1)
+            y = min(max(y, 0), height - 1)
+            passed[ii] |= marks[x, y]
+    return passed
+
+
+@_jit
+def look(off_track_map, center_x, center_y, direction, view_angles,
+         view_distances, block_view, view_x, view_y, view_field):
+    """
+    Evaluate the view field as in Driver.look. The view coordinates
+    and the view field are written into the given arrays.
+    """
+    width, height = off_track_map.shape
+    for ii in range(len(view_angles)):
+        cos_angle = cos(direction + view_angles[ii])
+        sin_angle = sin(direction + view_angles[ii])
+        blocked = False
+        for jj in range(len(view_distances)):
+            x = int(center_x + cos_angle * view_distances[jj])
+            y = int(center_y - sin_angle * view_distances[jj])
+            view_x[ii, jj] = x
+            view_y[ii, jj] = y
+            if blocked:  # the view behind corners etc.
+                view_field[ii, jj] = 1.
+                continue
+            # limit coordinates within track area
+            if x < 0 or x >= width:
+                x = 0
+            if y < 0 or y >= height:
+                y = 0
+            view_field[ii, jj] = off_track_map[x, y]
+            if block_view and view_field[ii, jj]:
+                blocked = True
+
+
+def check(n_poses=2000):
+    """
+    Compare the kernels with the NumPy implementations for random
+    car poses on the track. Returns the number of mismatches.
+    """
+    from environment import init_headless
+    init_headless()
+    from car import Car
+    from track import Track
+    import constants
+    import driver
+
+    track = Track()
+    start_position, start_direction = track.find_start(1)
+    car = Car("Check", constants.RED, start_position[0], start_direction,
+              driver.Driver())
+    reference = driver.Driver()
+    mismatches = 0
+    for ii in range(n_poses):
+        car.rect.center = (np.random.randint(0, constants.WIDTH_TRACK),
+                           np.random.randint(0, constants.HEIGHT_TRACK))
+        car.direction = start_direction + np.random.randint(0, 120) * constants.TURN_SPEED
+        car.speed = np.random.rand() * 5.
+        car.accelerate, car.brake = np.random.rand(2) > 0.5
+
+        speed = car.speed
+        if car.accelerate:
+            speed += constants.ACCELERATION
+        if car.brake:
+            speed -= constants.BRAKING
+        speed -= constants.FRICTION
+        speed = max(speed, 0.)
+        stepped = car_step(car.speed, car.pos_x, car.pos_y, car.direction,
+                           car.accelerate, car.brake, constants.ACCELERATION,
+                           constants.BRAKING, constants.FRICTION)
+        if stepped != (speed, car.pos_x + speed * cos(car.direction),
+                       car.pos_y - speed * sin(car.direction)):
+            mismatches += 1
+
+        corners_x = np.array(car._corner_coordinates()[0])
+        corners_y = np.array(car._corner_coordinates()[1])
+        corners_x1 = corners_x + np.random.randn(2) * 10.
+        corners_y1 = corners_y + np.random.randn(2) * 10.
+        if not np.array_equal(swept_marks(track.marks, corners_x, corners_y,
+                                          corners_x1, corners_y1),
+                              track._swept_numpy(track.marks, corners_x, corners_y,
+                                                 corners_x1, corners_y1)) or \
+           not np.array_equal(track._swept_python(track.marks, corners_x, corners_y,
+                                                  corners_x1, corners_y1),
+                              track._swept_numpy(track.marks, corners_x, corners_y,
+                                                 corners_x1, corners_y1)):
+            mismatches += 1
+
+        reference._look_numpy(car, track)
+        view_x = np.empty_like(reference.view_x)
+        view_y = np.empty_like(reference.view_y)
+        view_field = np.empty_like(reference.view_field)
+        look(track.off_track_map, car.rect.center[0], car.rect.center[1],
+             car.direction, reference.view_angles, reference.view_distances,
+             constants.BLOCK_VIEW, view_x, view_y, view_field)
+        if not (np.array_equal(view_x, reference.view_x) and
+                np.array_equal(view_y, reference.view_y) and
+                np.array_equal(view_field, reference.view_field)):
+            mismatches += 1
+    return mismatches
+
+
+if __name__ == '__main__':
+    print("Numba kernels enabled: {}".format(ENABLED))
+    print("Mismatches with NumPy: {}".format(check()))
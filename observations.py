@@ -0,0 +1,62 @@
+import numpy as np
+
+
+class Packed_observations(object):
+    """
+    This class implements compact storage for network input vectors whose
+    values are 0/1 except for a few leading ones, such as the speed term
+    followed by the driver's view field. The leading values are stored as
+    float32 and the binary values bit-packed, eight per byte. Samples are
+    unpacked only when read, for a batch at a time.
+
+    The storage grows when samples are appended beyond its capacity.
+    """
+    def __init__(self, n_inputs, capacity=1024, n_floats=1):
+        self.n_inputs = n_inputs
+        self.n_floats = n_floats
+        self.n_bits = n_inputs - n_floats
+        self.floats = np.zeros((capacity, n_floats), dtype=np.float32)
+        self.bits = np.zeros((capacity, (self.n_bits + 7) // 8), dtype=np.uint8)
+        self.size = 0
+
+    @property
+    def capacity(self):
+        return len(self.bits)
+
+    def __len__(self):
+        return self.size
+
+    def __setitem__(self, ind, inputs):
+        """
+        Store one input vector at the given index.
+        """
+        inputs = np.ravel(inputs)
+        self.floats[ind] = inputs[:self.n_floats]
+        self.bits[ind] = np.packbits(inputs[self.n_floats:] > 0.5)
+        self.size = max(self.size, ind + 1)
+
+    def __getitem__(self, inds):
+        """
+        Unpack the input vectors at the given index or array of indices.
+        """
+        floats = self.floats[inds]
+        samples = np.empty(floats.shape[:-1] + (self.n_inputs,))
+        samples[..., :self.n_floats] = floats
+        samples[..., self.n_floats:] = np.unpackbits(self.bits[inds], axis=-1,
+                                                     count=self.n_bits)
+        return samples
+
+    def append(self, inputs):
+        """
+        Store an input vector after the previous ones.
+        """
+        if self.size == self.capacity:
+            self._grow()
+        self[self.size] = inputs
+
+    def _grow(self):
+        """
+        Double the capacity.
+        """
+        self.floats = np.concatenate((self.floats, np.zeros_like(self.floats)))
+        self.bits = np.concatenate((self.bits, np.zeros_like(self.bits)))
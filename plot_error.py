@@ -15,6 +15,7 @@ class Error_plot(object):
         self.errors = []
         self.mean_errors = []
         self.xpos = []
+        self.frame_next_plot = 0
 
         for car in cars:
             # car colors are in range [0, 255]; must be normalized for pyplot
@@ -42,7 +43,9 @@ class Error_plot(object):
         for ii, car in enumerate(self.cars):
             self.errors[ii].append(car.driver.error)
 
-        if frame_counter % constants.PLOT_ERROR_INTERVAL == 0:
+        # frames may be skipped when fast forwarding
+        if frame_counter >= self.frame_next_plot:
+            self.frame_next_plot = frame_counter + constants.PLOT_ERROR_INTERVAL
             self.xpos.append(frame_counter / constants.FRAME_RATE)
 
             for ii, car in enumerate(self.cars):
@@ -0,0 +1,108 @@
+import hashlib
+import os
+from math import cos, sin
+
+import numpy as np
+
+import constants
+
+
+def load_progress_map(marks, start_direction, mark_off_track, mark_finish,
+                      cache_dir=constants.CACHE_DIR):
+    """
+    Return the progress map of a track, computing it if it is not cached
+    on disk as a .npy file.
+    """
+    key = hashlib.sha1()
+    key.update(np.ascontiguousarray(marks).tobytes())
+    key.update(np.array([start_direction, mark_off_track, mark_finish], dtype=float).tobytes())
+    filename = os.path.join(cache_dir, "progress_{}.npy".format(key.hexdigest()[:16]))
+    if not os.path.exists(filename):
+        progress_map = build_progress_map(marks, start_direction,
+                                          mark_off_track, mark_finish)
+        if not os.path.isdir(cache_dir):
+            os.makedirs(cache_dir)
+        tmp_filename = filename + ".{}.tmp.npy".format(os.getpid())
+        np.save(tmp_filename, progress_map)
+        os.replace(tmp_filename, filename)
+    return np.load(filename)
+
+
+def build_progress_map(marks, start_direction, mark_off_track, mark_finish):
+    """
+    Compute the distance along the track from the middle of the finish
+    line for every pixel. A wavefront is grown on the track from there
+    in the racing direction; the back half of the finish line stops it,
+    so the distance grows over the lap. Growing alternately by the 4 and
+    8 neighbors approximates the Euclidean distance.
+
+    The back half of the finish line gets distance 0, and off track
+    pixels the distance of the nearest track pixel.
+    """
+    finish = (marks & mark_finish) > 0
+    finish_x, finish_y = np.nonzero(finish)
+    offsets = np.array([finish_x - finish_x.mean(), finish_y - finish_y.mean()])
+    # the normal of the finish line is the direction of its least extent,
+    # pointing to the racing direction
+    normal = np.linalg.eigh(np.cov(offsets))[1][:, 0]
+    if normal[0] * cos(start_direction) - normal[1] * sin(start_direction) < 0.:  # y down
+        normal = -normal
+    ahead = np.dot(normal, offsets)
+    behind = np.zeros_like(finish)
+    behind[finish_x[ahead < 0.], finish_y[ahead < 0.]] = True
+    passable = ((marks & mark_off_track) == 0) & ~behind
+
+    # start from the middle of the finish line
+    frontier = np.zeros_like(finish)
+    middle = (ahead >= 0.) & (ahead < 1.5)
+    frontier[finish_x[middle], finish_y[middle]] = True
+
+    progress_map = np.full(marks.shape, -1., dtype=np.float32)
+    progress_map[frontier] = 0.
+    reached = frontier.copy()
+    distance = 0
+    while frontier.any():
+        distance += 1
+        frontier = _grow(frontier, diagonal=distance % 2 == 0) & passable & ~reached
+        reached |= frontier
+        progress_map[frontier] = distance
+
+    progress_map[behind] = 0.
+    reached |= behind
+    while not reached.all():
+        nearest = _neighbor_max(progress_map)
+        new = ~reached & (nearest >= 0.)
+        if not new.any():
+            break
+        progress_map[new] = nearest[new]
+        reached |= new
+    return progress_map
+
+
+def _grow(mask, diagonal):
+    """
+    Grow the mask by one pixel to the 4 or 8 neighbors.
+    """
+    grown = mask.copy()
+    grown[1:, :] |= mask[:-1, :]
+    grown[:-1, :] |= mask[1:, :]
+    grown[:, 1:] |= mask[:, :-1]
+    grown[:, :-1] |= mask[:, 1:]
+    if diagonal:
+        grown[1:, 1:] |= mask[:-1, :-1]
+        grown[:-1, :-1] |= mask[1:, 1:]
+        grown[1:, :-1] |= mask[:-1, 1:]
+        grown[:-1, 1:] |= mask[1:, :-1]
+    return grown
+
+
+def _neighbor_max(values):
+    """
+    The largest value among the 4 neighbors of each pixel.
+    """
+    nearest = np.full_like(values, -1.)
+    np.maximum(nearest[1:, :], values[:-1, :], out=nearest[1:, :])
+    np.maximum(nearest[:-1, :], values[1:, :], out=nearest[:-1, :])
+    np.maximum(nearest[:, 1:], values[:, :-1], out=nearest[:, 1:])
+    np.maximum(nearest[:, :-1], values[:, 1:], out=nearest[:, :-1])
+    return nearest
@@ -0,0 +1,153 @@
+import numpy as np
+
+from observations import Packed_observations
+
+
+class Sum_tree(object):
+    """
+    This class implements a sum tree over a fixed number of priorities.
+    The tree is stored in an array in heap order: node ii has children
+    2*ii and 2*ii+1, the root is at 1 and the leaves at capacity...
+    Updating priorities and sampling proportionally to them take
+    O(log n) operations per item, and both work on batches of items.
+    The number of leaves is rounded up to a power of two, so that all
+    leaves are on the same level.
+    """
+    def __init__(self, capacity):
+        self.capacity = 1 << max(0, int(capacity - 1).bit_length())
+        self.tree = np.zeros(2 * self.capacity)
+
+    @property
+    def total(self):
+        return self.tree[1]
+
+    def __getitem__(self, indices):
+        return self.tree[np.asarray(indices) + self.capacity]
+
+    def update(self, indices, priorities):
+        """
+        Set the priorities of the given items and update the sums.
+        """
+        nodes = np.asarray(indices) + self.capacity
+        self.tree[nodes] = priorities
+        nodes = np.unique(nodes // 2)
+        while nodes[0] >= 1:
+            self.tree[nodes] = self.tree[2*nodes] + self.tree[2*nodes + 1]
+            nodes = np.unique(nodes // 2)
+
+    def find(self, values):
+        """
+        Find the items where the cumulative sum of priorities reaches
+        the given values (in range [0, total)).
+        """
+        values = np.array(values, dtype=float)
+        nodes = np.ones(len(values), dtype=int)
+        inner = nodes < self.capacity
+        while np.any(inner):
+            left = 2 * nodes[inner]
+            go_right = values[inner] >= self.tree[left]
+            values[inner] -= self.tree[left] * go_right
+            nodes[inner] = left + go_right
+            inner = nodes < self.capacity
+        return nodes - self.capacity
+
+
+class Replay_memory(object):
+    """
+    This class implements the replay memory for ReinforcedLearner:
+    a ring buffer of (prev_state, action, new_state, reward) transitions
+    in preallocated arrays. The states are stored bit-packed.
+    Transitions are sampled uniformly, without replacement.
+    """
+    def __init__(self, capacity, n_inputs):
+        self.capacity = capacity
+        self.prev_states = Packed_observations(n_inputs, capacity)
+        self.actions = np.zeros(capacity, dtype=int)
+        self.new_states = Packed_observations(n_inputs, capacity)
+        self.rewards = np.zeros(capacity)
+        self.size = 0
+        self._next = 0
+        # seeded from the global state, so that np.random.seed still applies
+        self._rng = np.random.default_rng(np.random.randint(2**31))
+
+    def __len__(self):
+        return self.size
+
+    def add(self, prev_state, action, new_state, reward):
+        """
+        Store a transition, replacing the oldest one if the memory is full.
+        Returns the index of the stored transition.
+        """
+        ind = self._next
+        self.prev_states[ind] = np.ravel(prev_state)
+        self.actions[ind] = action
+        self.new_states[ind] = np.ravel(new_state)
+        self.rewards[ind] = reward
+        self._next = (self._next + 1) % self.capacity
+        self.size = min(self.size + 1, self.capacity)
+        return ind
+
+    def sample(self, n_samples):
+        """
+        Select transitions to train on. Returns the indices of the
+        transitions and their importance weights for training.
+        """
+        inds = self._rng.choice(self.size, min(self.size, n_samples), replace=False)
+        return inds, np.ones(len(inds))
+
+    def update_priorities(self, inds, td_errors):
+        """
+        Uniform sampling does not use priorities.
+        """
+        pass
+
+
+class Prioritized_replay(Replay_memory):
+    """
+    This class implements prioritized replay: transitions are sampled
+    proportionally to their TD error raised to the power alpha, using
+    a sum tree. The bias from the non-uniform sampling is compensated
+    with importance weights (N * P)^-beta, normalized by their maximum.
+
+    See Schaul et al.: Prioritized Experience Replay (2015).
+    """
+    def __init__(self, capacity, n_inputs, alpha=0.6, beta=0.4, epsilon=1e-3):
+        super(Prioritized_replay, self).__init__(capacity, n_inputs)
+        self.alpha = alpha
+        self.beta = beta
+        self.epsilon = epsilon  # keeps every transition possible to sample
+        self.priorities = Sum_tree(capacity)
+        self.max_priority = 1.
+
+    def add(self, prev_state, action, new_state, reward):
+        """
+        Store a transition with the highest priority seen so far, so
+        that new transitions are trained on at least once.
+        """
+        ind = super(Prioritized_replay, self).add(prev_state, action,
+                                                  new_state, reward)
+        self.priorities.update([ind], [self.max_priority])
+        return ind
+
+    def sample(self, n_samples):
+        """
+        Select transitions proportionally to their priorities, one from
+        each of n_samples equal slices of the total priority.
+        Returns the indices of the transitions and their importance weights.
+        """
+        n_samples = min(self.size, n_samples)
+        total = self.priorities.total
+        values = (np.arange(n_samples) + np.random.rand(n_samples)) * total / n_samples
+        inds = np.minimum(self.priorities.find(values), self.size - 1)
+
+        probabilities = self.priorities[inds] / total
+        weights = (self.size * probabilities) ** -self.beta
+        return inds, weights / np.max(weights)
+
+    def update_priorities(self, inds, td_errors):
+        """
+        Set the priorities of the transitions from their new TD errors.
+        """
+        priorities = (np.abs(td_errors) + self.epsilon) ** self.alpha
+        self.priorities.update(inds, priorities)
+        self.max_priority = max(self.max_priority, np.max(priorities))
@@ -0,0 +1,167 @@
+import multiprocessing
+from multiprocessing import shared_memory
+
+import numpy as np
+
+import constants
+from environment import Vector_env
+
+
+class Sharded_env(object):
+    """
+    This class implements the Vector_env interface with the cars sharded
+    over worker processes. Each worker holds its own Track and a Vector_env
+    for its share of the cars. Observations, rewards, done flags and
+    actions are exchanged through shared memory arrays; only short
+    commands go through the pipes.
+
+    The returned arrays are owned by the environment and overwritten on
+    the next step.
+
+    Cars in different workers cannot find each other, so car collisions
+    and visible cars (CAR_COLLISIONS, CARS_VISIBLE) are not supported.
+    """
+    n_actions = Vector_env.n_actions
+
+    def __init__(self, n_cars, n_workers=None, action_repeat=1, **driver_kwargs):
+        if constants.CAR_COLLISIONS or constants.CARS_VISIBLE:
+            raise ValueError("Sharded_env does not support CAR_COLLISIONS or CARS_VISIBLE; "
+                             "use Vector_env")
+        if n_workers is None:
+            n_workers = multiprocessing.cpu_count()
+        n_workers = max(1, min(n_workers, n_cars))
+        self.n_cars = n_cars
+        self.action_repeat = action_repeat
+        view_resolution = driver_kwargs.get('view_resolution',
+                                            constants.VIEW_RESOLUTION)
+        self.n_inputs = view_resolution[0] * view_resolution[1] + 1  # viewpoints + speed
+
+        self._shared = []
+        self.observations = self._shared_array((n_cars, self.n_inputs), np.float64)
+        self.rewards = self._shared_array((n_cars,), np.float64)
+        self.dones = self._shared_array((n_cars,), np.bool_)
+        self.actions = self._shared_array((n_cars,), np.int64)
+        names = [shm.name for shm in self._shared]
+
+        # spawn fresh workers so that no pygame state is inherited
+        context = multiprocessing.get_context('spawn')
+        bounds = np.linspace(0, n_cars, n_workers+1).astype(int)
+        self._pipes = []
+        self._workers = []
+        for ii in range(n_workers):
+            pipe, worker_pipe = context.Pipe()
+            worker = context.Process(target=_worker,
+                                     args=(worker_pipe, names, n_cars, self.n_inputs,
+                                           bounds[ii], bounds[ii+1], action_repeat,
+                                           driver_kwargs))
+            worker.daemon = True
+            worker.start()
+            self._pipes.append(pipe)
+            self._workers.append(worker)
+        self._wait()
+
+    def _shared_array(self, shape, dtype):
+        """
+        Allocate an array in shared memory.
+        """
+        nbytes = max(1, int(np.prod(shape)) * np.dtype(dtype).itemsize)
+        shm = shared_memory.SharedMemory(create=True, size=nbytes)
+        self._shared.append(shm)
+        return np.ndarray(shape, dtype=dtype, buffer=shm.buf)
+
+    def _command(self, command):
+        for pipe in self._pipes:
+            pipe.send(command)
+        self._wait()
+
+    def _wait(self):
+        for pipe in self._pipes:
+            reply = pipe.recv()
+            if reply != 'ok':
+                self.close()
+                raise RuntimeError("Environment worker failed:\n" + reply)
+
+    def reset(self):
+        """
+        Reset all cars back to start and return the observations.
+        """
+        self._command('reset')
+        return self.observations
+
+    def step(self, actions):
+        """
+        Apply the actions to the cars for action_repeat frames.
+        Returns the observations, rewards and done flags.
+        """
+        self.actions[:] = actions
+        self._command('step')
+        return self.observations, self.rewards, self.dones
+
+    def close(self):
+        """
+        Stop the workers and release the shared memory.
+        """
+        for pipe in self._pipes:
+            try:
+                pipe.send('close')
+            except (BrokenPipeError, EOFError, OSError):
+                pass
+        for worker in self._workers:
+            worker.join(timeout=5)
+        self._pipes = []
+        self._workers = []
+        # drop the array views before releasing the buffers
+        self.observations = self.rewards = self.dones = self.actions = None
+        for shm in self._shared:
+            shm.close()
+            shm.unlink()
+        self._shared = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+
+def _worker(pipe, names, n_cars, n_inputs, first, last, action_repeat,
+            driver_kwargs):
+    """
+    Worker process stepping the cars first...last-1 in a Vector_env
+    that writes directly into the shared arrays.
+    """
+    try:
+        shared = [shared_memory.SharedMemory(name=name) for name in names]
+        observations = np.ndarray((n_cars, n_inputs), dtype=np.float64,
+                                  buffer=shared[0].buf)
+        rewards = np.ndarray((n_cars,), dtype=np.float64, buffer=shared[1].buf)
+        dones = np.ndarray((n_cars,), dtype=np.bool_, buffer=shared[2].buf)
+        actions = np.ndarray((n_cars,), dtype=np.int64, buffer=shared[3].buf)
+        env = Vector_env(last - first, action_repeat,
+                         first_slot=first, n_slots=n_cars,
+                         buffers=(observations[first:last], rewards[first:last],
+                                  dones[first:last]),
+                         **driver_kwargs)
+        pipe.send('ok')
+    except Exception:
+        import traceback
+        pipe.send(traceback.format_exc())
+        return
+
+    while True:
+        command = pipe.recv()
+        try:
+            if command == 'reset':
+                env.reset()
+            elif command == 'step':
+                env.step(actions[first:last])
+            elif command == 'close':
+                break
+            pipe.send('ok')
+        except Exception:
+            import traceback
+            pipe.send(traceback.format_exc())
+
+    del observations, rewards, dones, actions, env
+    for shm in shared:
+        shm.close()
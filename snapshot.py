@@ -0,0 +1,100 @@
+import numpy as np
+import pygame
+
+import ann
+
+# the state of one car; one record per car
+CAR_STATE = np.dtype([('pos_x', float), ('pos_y', float),
+                      ('direction', float), ('speed', float),
+                      ('distance_total', float), ('distance_try', float),
+                      ('progress', float), ('progress_total', float),
+                      ('lap_frame', float), ('lap_frame_prev', float),
+                      ('lap_frame_best', float),
+                      ('laps', int), ('laps_total', int), ('crashes', int),
+                      ('halfway', bool), ('colliding', bool),
+                      ('accelerate', bool), ('brake', bool),
+                      ('turn_left', bool), ('turn_right', bool),
+                      ('rect', int, 4)])
+CAR_FIELDS = [name for name in CAR_STATE.names if name != 'rect']
+
+
+class Snapshot(object):
+    """
+    This class holds the state of a simulation: a record of the state of
+    each car, the view fields and network parameters of their drivers
+    concatenated into flat arrays, and the frame counter.
+    """
+    def __init__(self, frame_counter, cars, views, params):
+        self.frame_counter = frame_counter
+        self.cars = cars
+        self.views = views
+        self.params = params
+
+    def copy(self):
+        return Snapshot(self.frame_counter, self.cars.copy(),
+                        self.views.copy(), self.params.copy())
+
+
+def take_snapshot(cars, frame_counter, networks=True):
+    """
+    Capture the state of the cars. The parameters of the (non-Keras)
+    networks of the drivers are included if networks is True.
+    """
+    records = np.empty(len(cars), dtype=CAR_STATE)
+    for record, car in zip(records, cars):
+        for name in CAR_FIELDS:
+            record[name] = getattr(car, name)
+        record['rect'] = tuple(car.rect)
+
+    views = np.concatenate([car.driver.view_field.ravel() for car in cars])
+    if networks:
+        params = [network.get_params() for network in _networks(cars)]
+    else:
+        params = []
+    params = np.concatenate(params) if params else np.empty(0)
+    return Snapshot(frame_counter, records, views, params)
+
+
+def restore_snapshot(snapshot, cars):
+    """
+    Set the cars back to the captured state. The cars must be the same
+    ones (or built the same way) as when the snapshot was taken.
+    The drivers are told about it through their restored method.
+    Returns the frame counter of the snapshot.
+    """
+    offset = 0
+    for record, car in zip(snapshot.cars, cars):
+        direction_prev = car.direction
+        for name in CAR_FIELDS:
+            setattr(car, name, record[name].item())
+        if car.direction != direction_prev:
+            car.rotate_image()
+        car.rect = pygame.Rect(*record['rect'])
+
+        view_field = car.driver.view_field
+        view_field.flat[:] = snapshot.views[offset: offset+view_field.size]
+        offset += view_field.size
+
+    if len(snapshot.params) > 0:
+        offset = 0
+        for network in _networks(cars):
+            n_params = network.get_params().size
+            network.set_params(snapshot.params[offset: offset+n_params])
+            offset += n_params
+
+    for car in cars:
+        car.driver.restored(car)
+    return snapshot.frame_counter
+
+
+def _networks(cars):
+    """
+    The distinct networks of the drivers of the cars, in order.
+    """
+    networks = []
+    for car in cars:
+        network = getattr(car.driver, 'ann', None)
+        if isinstance(network, ann.ANN) and \
+           not any(network is other for other in networks):
+            networks.append(network)
+    return networks
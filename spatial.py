@@ -0,0 +1,51 @@
+from math import floor
+
+import numpy as np
+
+
+class Spatial_grid(object):
+    """
+    This class implements a uniform grid for finding points near a
+    location, e.g. cars near another car. The points are bucketed by cell
+    when the grid is rebuilt, and a query only looks at the cells that
+    the query circle overlaps. Points outside the area go to the border
+    cells.
+    """
+    def __init__(self, width, height, cell_size):
+        self.cell_size = float(cell_size)
+        self.n_cells_x = int(np.ceil(width / self.cell_size))
+        self.n_cells_y = int(np.ceil(height / self.cell_size))
+        self.rebuild([], [])
+
+    def rebuild(self, points_x, points_y):
+        """
+        Put the points into the cells. The points are referred to by
+        their indices in the given sequences.
+        """
+        cells_x = np.clip(np.floor_divide(points_x, self.cell_size).astype(int),
+                          0, self.n_cells_x - 1)
+        cells_y = np.clip(np.floor_divide(points_y, self.cell_size).astype(int),
+                          0, self.n_cells_y - 1)
+        # cells are numbered along y first, so that a column of cells
+        # is a contiguous range of the sorted points
+        cells = cells_x * self.n_cells_y + cells_y
+        self.order = np.argsort(cells, kind='stable')
+        counts = np.bincount(cells, minlength=self.n_cells_x * self.n_cells_y)
+        self.cell_start = np.concatenate(([0], np.cumsum(counts)))
+
+    def query(self, x, y, radius):
+        """
+        Return the indices of the points in the cells within radius of
+        (x, y). The caller checks the actual distances.
+        """
+        first_x = min(max(int(floor((x - radius) / self.cell_size)), 0), self.n_cells_x - 1)
+        last_x = min(max(int(floor((x + radius) / self.cell_size)), 0), self.n_cells_x - 1)
+        first_y = min(max(int(floor((y - radius) / self.cell_size)), 0), self.n_cells_y - 1)
+        last_y = min(max(int(floor((y + radius) / self.cell_size)), 0), self.n_cells_y - 1)
+        indices = []
+        for cell_x in range(first_x, last_x + 1):
+            first_cell = cell_x * self.n_cells_y + first_y
+            last_cell = cell_x * self.n_cells_y + last_y
+            indices.extend(self.order[self.cell_start[first_cell]:
+                                      self.cell_start[last_cell + 1]].tolist())
+        return indices
@@ -0,0 +1,224 @@
+"""
+Run a hyperparameter sweep for a learning driver. Each configuration is
+driven headlessly for a fixed number of frames, in a process pool, with
+an AI_TIF car as the model car. The results (laps, best lap, crashes and
+distance of the learning car) are appended to a CSV file; configurations
+already in the file are skipped, so an interrupted sweep can be resumed.
+
+Parameters are given as name=value1,value2,... Ranges lo:hi are sampled
+uniformly in random search, as integers if both ends are integers.
+View resolutions are given as e.g. 5x4.
+
+Examples:
+    python sweep.py ANN_Batch results.csv learning_rate=0.1,0.2,0.5 n_hidden_neurons=5,10
+    python sweep.py ReinforcedLearner rl.csv discount=0.8:0.99 --random 20 --seeds 3
+"""
+import argparse
+import csv
+import itertools
+import json
+import os
+import random
+from concurrent.futures import ProcessPoolExecutor, as_completed
+import multiprocessing
+
+import numpy as np
+
+import constants
+
+RESULT_FIELDS = ['laps', 'best_lap', 'crashes', 'distance']
+VIEW_PARAMETERS = ['view_distance', 'view_resolution', 'view_angle']
+
+
+def parse_value(text):
+    """
+    Convert a parameter value from text.
+    """
+    if 'x' in text:
+        return tuple(int(value) for value in text.split('x'))
+    for convert in (int, float):
+        try:
+            return convert(text)
+        except ValueError:
+            pass
+    return text
+
+
+def parse_parameters(specs):
+    """
+    Parse name=value1,value2 or name=lo:hi specifications into a dict.
+    """
+    parameters = {}
+    for spec in specs:
+        name, values = spec.split('=', 1)
+        if ':' in values:
+            parameters[name] = tuple(parse_value(value) for value in values.split(':'))
+        else:
+            parameters[name] = [parse_value(value) for value in values.split(',')]
+    return parameters
+
+
+def expand_grid(parameters):
+    """
+    All combinations of the parameter values.
+    """
+    for name, values in parameters.items():
+        if isinstance(values, tuple):
+            raise ValueError("Range given for {}; ranges need --random".format(name))
+    names = sorted(parameters)
+    for values in itertools.product(*[parameters[name] for name in names]):
+        yield dict(zip(names, values))
+
+
+def sample_random(parameters, n_configs, seed=0):
+    """
+    Random combinations of the parameter values; ranges are sampled uniformly,
+    as integers if both ends are integers.
+    """
+    rng = random.Random(seed)
+    for ii in range(n_configs):
+        config = {}
+        for name in sorted(parameters):
+            values = parameters[name]
+            if isinstance(values, tuple) and all(isinstance(value, int) for value in values):
+                config[name] = rng.randint(*values)  # both ends included
+            elif isinstance(values, tuple):
+                config[name] = rng.uniform(*values)
+            else:
+                config[name] = rng.choice(values)
+        yield config
+
+
+def config_key(driver_name, config, seed, frames):
+    """
+    Identify a run in the results file.
+    """
+    return json.dumps([driver_name, config, seed, frames], sort_keys=True)
+
+
+def run(driver_name, config, seed, frames, train_interval):
+    """
+    Drive a learning car with the given driver parameters for a number of
+    frames and return its results. ANN_Batch drivers are trained every
+    train_interval frames. The model car gets the same view settings,
+    since the learner trains on its view.
+    """
+    np.random.seed(seed)
+    random.seed(seed)
+
+    from environment import init_headless
+    init_headless()
+    from car import Car
+    from track import Track
+    import driver
+
+    track = Track()
+    start_position, start_direction = track.find_start(2)
+    view_config = {name: config[name] for name in VIEW_PARAMETERS if name in config}
+    model_car = Car("AI_TIF", constants.YELLOW, start_position[1],
+                    start_direction, driver.AI_TIF(**view_config))
+    learner_car = Car(driver_name, constants.RED, start_position[0], start_direction,
+                      getattr(driver, driver_name)(model_car=model_car, **config))
+    cars = [learner_car, model_car]
+
+    for frame_counter in range(frames):
+        for car in cars:
+            car.update(track, frame_counter)
+        if isinstance(learner_car.driver, driver.ANN_Batch) and \
+           (frame_counter + 1) % train_interval == 0:
+            learner_car.driver.train()
+
+    best_lap = learner_car.lap_frame_best if learner_car.laps_total > 0 else ''
+    return {'laps': learner_car.laps_total,
+            'best_lap': best_lap,
+            'crashes': learner_car.crashes,
+            'distance': round(learner_car.distance_total, 1)}
+
+
+def read_header(filename):
+    """
+    The columns of the results file, or None if there is no file yet.
+    """
+    if not os.path.exists(filename):
+        return None
+    with open(filename) as results:
+        return next(csv.reader(results), None)
+
+
+def read_done(filename):
+    """
+    Keys of the runs already in the results file.
+    """
+    if not os.path.exists(filename):
+        return set()
+    with open(filename) as results:
+        return set(row['key'] for row in csv.DictReader(results))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("driver", choices=['ANN_Online', 'ANN_Batch', 'ReinforcedLearner'])
+    parser.add_argument("results", help="results file (.csv), appended to")
+    parser.add_argument("parameters", nargs='*', help="name=value1,value2,...")
+    parser.add_argument("--random", type=int, metavar='N',
+                        help="random search over N configurations instead of a grid")
+    parser.add_argument("--seeds", type=int, default=1,
+                        help="number of seeded runs per configuration")
+    parser.add_argument("--frames", type=int, default=60 * constants.FRAME_RATE,
+                        help="frame budget per run")
+    parser.add_argument("--train-interval", type=int, default=30 * constants.FRAME_RATE,
+                        help="frames between ANN_Batch trainings")
+    parser.add_argument("--workers", type=int, help="number of processes")
+    args = parser.parse_args()
+
+    parameters = parse_parameters(args.parameters)
+    if args.random is None:
+        configs = list(expand_grid(parameters))
+    else:
+        configs = list(sample_random(parameters, args.random))
+
+    done = read_done(args.results)
+    runs = []
+    for config in configs:
+        for seed in range(args.seeds):
+            key = config_key(args.driver, config, seed, args.frames)
+            if key not in done:
+                runs.append((key, config, seed))
+    print("{} runs to do, {} already done".format(
+          len(runs), len(configs) * args.seeds - len(runs)))
+
+    names = sorted(parameters)
+    fieldnames = ['key'] + names + ['seed'] + RESULT_FIELDS
+    header = read_header(args.results)
+    if header is not None and header != fieldnames:
+        parser.error("{} has the columns {}, not {}; use another results file".format(
+                     args.results, ','.join(header), ','.join(fieldnames)))
+    write_header = header is None
+    with open(args.results, 'a', newline='') as results_file:
+        writer = csv.DictWriter(results_file, fieldnames=fieldnames)
+        if write_header:
+            writer.writeheader()
+
+        context = multiprocessing.get_context('spawn')
+        with ProcessPoolExecutor(args.workers, mp_context=context) as executor:
+            futures = {executor.submit(run, args.driver, config, seed,
+                                       args.frames, args.train_interval):
+                       (key, config, seed) for key, config, seed in runs}
+            for future in as_completed(futures):
+                key, config, seed = futures[future]
+                try:
+                    result = future.result()
+                except Exception as error:  # left out of results, retried on resume
+                    print("Failed {}: {!r}".format(key, error))
+                    continue
+                row = {'key': key, 'seed': seed}
+                row.update({name: config[name] for name in names})
+                row.update(result)
+                writer.writerow(row)
+                results_file.flush()  # keep finished runs if interrupted
+                print(row)
+
+
+if __name__ == '__main__':
+    main()
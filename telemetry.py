@@ -0,0 +1,112 @@
+import json
+import os
+
+import numpy as np
+
+MAGIC = b"FAITLM1\n"
+
+# one record per car and frame
+RECORD = np.dtype([('frame', np.uint32), ('pos_x', np.float32), ('pos_y', np.float32),
+                   ('direction', np.float32), ('speed', np.float32),
+                   ('controls', np.uint8), ('events', np.uint8),
+                   ('laps', np.uint16), ('crashes', np.uint32),
+                   ('lap_frame', np.float32), ('error', np.float32),
+                   ('reward', np.float32)])
+
+# bits of the controls field
+ACCELERATE = 1
+BRAKE = 2
+TURN_LEFT = 4
+TURN_RIGHT = 8
+
+# bits of the events field
+EVENT_LAP = 1
+EVENT_CRASH = 2
+
+
+class Telemetry_writer(object):
+    """
+    This class writes per-frame telemetry of cars into a binary log:
+    a header with the car names and colors, followed by fixed-size
+    records, one per car and frame. Records are collected into a
+    buffer that is written to disk when full.
+    """
+    def __init__(self, filename, cars, buffer_frames=1000):
+        self.cars = list(cars)
+        directory = os.path.dirname(filename)
+        if directory and not os.path.isdir(directory):
+            os.makedirs(directory)
+        self._file = open(filename, 'wb')
+        header = json.dumps({'names': [car.name for car in self.cars],
+                             'colors': [list(car.color) for car in self.cars],
+                             'record': RECORD.descr}).encode()
+        self._file.write(MAGIC)
+        self._file.write(np.uint32(len(header)).tobytes())
+        self._file.write(header)
+
+        self._buffer = np.zeros((buffer_frames, len(self.cars)), dtype=RECORD)
+        self._n_buffered = 0
+        self._laps_prev = [car.laps_total for car in self.cars]
+        self._crashes_prev = [car.crashes for car in self.cars]
+
+    def record(self, frame_counter):
+        """
+        Add the state of every car in this frame.
+        """
+        records = self._buffer[self._n_buffered]
+        for ii, car in enumerate(self.cars):
+            events = 0
+            if car.laps_total != self._laps_prev[ii]:
+                events |= EVENT_LAP
+                self._laps_prev[ii] = car.laps_total
+            if car.crashes != self._crashes_prev[ii]:
+                events |= EVENT_CRASH
+                self._crashes_prev[ii] = car.crashes
+            records[ii] = (frame_counter, car.pos_x, car.pos_y, car.direction,
+                           car.speed,
+                           (ACCELERATE * car.accelerate + BRAKE * car.brake +
+                            TURN_LEFT * car.turn_left + TURN_RIGHT * car.turn_right),
+                           events, car.laps_total, car.crashes,
+                           car.lap_frame, car.driver.error,
+                           getattr(car.driver, 'reward', 0.))  # of learning drivers
+        self._n_buffered += 1
+        if self._n_buffered == len(self._buffer):
+            self.flush()
+
+    def flush(self):
+        """
+        Write the buffered records to disk.
+        """
+        self._buffer[:self._n_buffered].tofile(self._file)
+        self._n_buffered = 0
+        self._file.flush()
+
+    def close(self):
+        self.flush()
+        self._file.close()
+
+
+class Telemetry_log(object):
+    """
+    This class reads a telemetry log. The records are memory mapped
+    as an array with one row per frame and one column per car.
+    """
+    def __init__(self, filename):
+        with open(filename, 'rb') as log:
+            if log.read(len(MAGIC)) != MAGIC:
+                raise ValueError("{} is not a telemetry log".format(filename))
+            header_length = int(np.frombuffer(log.read(4), dtype=np.uint32)[0])
+            header = json.loads(log.read(header_length).decode())
+        self.names = header['names']
+        self.colors = [tuple(color) for color in header['colors']]
+        record = np.dtype([tuple(field) for field in header['record']])
+        offset = len(MAGIC) + 4 + header_length
+        n_frames = (os.path.getsize(filename) - offset) // (record.itemsize * len(self.names))
+        if n_frames > 0:
+            self.records = np.memmap(filename, dtype=record, mode='r', offset=offset,
+                                     shape=(n_frames, len(self.names)))
+        else:
+            self.records = np.zeros((0, len(self.names)), dtype=record)
+
+    def __len__(self):
+        return len(self.records)
@@ -0,0 +1,131 @@
+"""
+Replay a telemetry log written by the game, without running any AI.
+
+Keys:
+    SPACE       pause/continue
+    UP/DOWN     double/halve the replay speed
+    LEFT/RIGHT  seek back/forward 1 s (10 s with SHIFT)
+    HOME/END    seek to the beginning/end
+    R           reload the log, e.g. if the run is still going
+
+Example:
+    python telemetry_viewer.py telemetry/run.tlm
+"""
+import sys
+
+import pygame
+
+from car import Car
+import driver
+from track import Track
+from statusbar import mins_secs
+from telemetry import Telemetry_log, ACCELERATE, BRAKE, TURN_LEFT, TURN_RIGHT
+import constants
+
+
+def place_car(car, record):
+    """
+    Put the car sprite where the record says.
+    """
+    car.direction = float(record['direction'])
+    car.rotate_image()
+    car.rect = car.image.get_rect()
+    car.rect.x = int(record['pos_x'])
+    car.rect.y = int(record['pos_y'])
+
+
+def draw_status(screen, font, log, frame, speed, paused):
+    """
+    Draw the replay state and the cars' status next to the track.
+    """
+    screen.fill(constants.WHITE, (constants.WIDTH_TRACK, 0,
+                                  constants.WIDTH_STATUS, constants.HEIGHT_STATUS))
+    box_x = constants.WIDTH_TRACK + 10
+    lines = ["{0:02.0f}:{1:05.2f}".format(*mins_secs(log.records[frame, 0]['frame'])),
+             "Frame {} / {}".format(frame, len(log) - 1),
+             "Speed x{:g}".format(speed) + (" (paused)" if paused else ""),
+             ""]
+    for name, record in zip(log.names, log.records[frame]):
+        controls = ''.join(letter if record['controls'] & bit else ' '
+                           for letter, bit in [('A', ACCELERATE), ('L', TURN_LEFT),
+                                               ('B', BRAKE), ('R', TURN_RIGHT)])
+        lines.append(name)
+        lines.append("  Laps: {} Crashes: {}".format(record['laps'], record['crashes']))
+        lines.append("  Speed: {:.2f} {}".format(record['speed'], controls))
+        if 'reward' in record.dtype.names:  # not in older logs
+            lines.append("  Reward: {:.2f}".format(record['reward']))
+    for ii, line in enumerate(lines):
+        screen.blit(font.render(line, 1, constants.COLOR_TEXT), (box_x, 10 + 20 * ii))
+
+
+def main(filename):
+    pygame.init()
+    clock = pygame.time.Clock()
+    screen = pygame.display.set_mode((constants.WIDTH_SCREEN,
+                                      constants.HEIGHT_SCREEN))
+    pygame.display.set_caption("FormulaAI replay: " + filename)
+    font = pygame.font.Font(None, 22)
+
+    track = Track()
+    log = Telemetry_log(filename)
+    if len(log) == 0:
+        print("No frames in " + filename)
+        return
+    cars = pygame.sprite.Group()
+    car_list = []
+    for name, color in zip(log.names, log.colors):
+        car = Car(name, color, (0, 0), 0., driver.Driver())
+        car_list.append(car)
+        cars.add(car)
+
+    position = 0.  # frame as float, to allow slow replay
+    speed = 1.
+    paused = False
+    done = False
+    while not done:
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT:
+                done = True
+            elif event.type == pygame.KEYDOWN:
+                seek = constants.FRAME_RATE
+                if event.mod & pygame.KMOD_SHIFT:
+                    seek *= 10
+                if event.key == pygame.K_SPACE:
+                    paused = not paused
+                elif event.key == pygame.K_UP:
+                    speed *= 2.
+                elif event.key == pygame.K_DOWN:
+                    speed /= 2.
+                elif event.key == pygame.K_LEFT:
+                    position -= seek
+                elif event.key == pygame.K_RIGHT:
+                    position += seek
+                elif event.key == pygame.K_HOME:
+                    position = 0.
+                elif event.key == pygame.K_END:
+                    position = len(log) - 1
+                elif event.key == pygame.K_r:
+                    log = Telemetry_log(filename)
+
+        if not paused:
+            position += speed
+        position = min(max(position, 0.), len(log) - 1.)
+        frame = int(position)
+
+        for car, record in zip(car_list, log.records[frame]):
+            place_car(car, record)
+        track.draw(screen)
+        cars.draw(screen)
+        draw_status(screen, font, log, frame, speed, paused)
+
+        clock.tick(constants.FRAME_RATE)
+        pygame.display.flip()
+
+    pygame.quit()
+
+
+if __name__ == '__main__':
+    if len(sys.argv) != 2:
+        print(__doc__)
+        sys.exit(1)
+    main(sys.argv[1])
@@ -1,19 +1,36 @@
+from math import ceil
+
 import pygame
 import numpy as np
 
+import assets
 import constants
+import kernels
+import progress
+from spatial import Spatial_grid
+from view_table import View_table
 
 class Track():
+    # bits in the marks map
+    MARK_OFF_TRACK = 1
+    MARK_HALFWAY = 2
+    MARK_FINISH = 4
+
     def __init__(self):
         self.load_track()
         self.load_mask()
+        self.load_progress()
         self.rect = self.image.get_rect()
+        self._view_tables = {}
+        self._car_grid = Spatial_grid(constants.WIDTH_TRACK, constants.HEIGHT_TRACK,
+                                      constants.CAR_GRID_CELL)
+        self.update_cars([])
 
     def load_track(self):
         """
         Load the track image.
         """
-        track_image = pygame.image.load(constants.TRACK_FILE).convert()
+        track_image = assets.image(constants.TRACK_FILE)
         self.image = pygame.Surface((constants.WIDTH_TRACK, constants.HEIGHT_TRACK))
         self.image.blit(track_image, (0, 0))
 
@@ -23,9 +40,26 @@ class Track():
         The mask is white, but here it's enough to check for blue values,
         since no other mask things use blue.
         """
-        self.track_mask = pygame.image.load(constants.TRACK_MASK_FILE).convert()
+        self.track_mask = assets.image(constants.TRACK_MASK_FILE)
         blues = pygame.surfarray.pixels_blue(self.track_mask)
-        self._off_track = (blues == constants.COLOR_OFF_TRACK[2]) * 1.
+        self.off_track_map = (blues == constants.COLOR_OFF_TRACK[2]) * 1.
+
+        # all the marks in one map, so that they can be checked at once
+        pixels = pygame.surfarray.pixels3d(self.track_mask)
+        self.marks = ((blues == constants.COLOR_OFF_TRACK[2]) * self.MARK_OFF_TRACK
+                      | np.all(pixels == constants.COLOR_HALFWAY, axis=-1) * self.MARK_HALFWAY
+                      | np.all(pixels == constants.COLOR_FINISH, axis=-1) * self.MARK_FINISH
+                      ).astype(np.uint8)
+
+    def load_progress(self):
+        """
+        Load the map of distances along the track from the finish line,
+        computed once and cached on disk.
+        """
+        self.progress_map = progress.load_progress_map(self.marks, self.find_start(1)[1],
+                                                       self.MARK_OFF_TRACK,
+                                                       self.MARK_FINISH)
+        self.lap_length = float(self.progress_map.max())
 
     def draw(self, screen):
         screen.blit(self.image, (0, 0))
@@ -34,7 +68,123 @@ class Track():
         """
         Check if the coordinate point (x,y) is off track.
         """
-        return self._off_track[point_x, point_y]
+        return self.off_track_map[point_x, point_y]
+
+    def lap_progress(self, point_x, point_y):
+        """
+        Returns the distance along the track from the finish line
+        at the coordinate point (x,y).
+        """
+        point_x = min(max(int(point_x), 0), constants.WIDTH_TRACK - 1)
+        point_y = min(max(int(point_y), 0), constants.HEIGHT_TRACK - 1)
+        return float(self.progress_map[point_x, point_y])
+
+    def progress_delta(self, progress_prev, progress):
+        """
+        Returns the progress along the track between two lap progresses,
+        also across the finish line. Negative when driving backwards.
+        Works for arrays, too.
+        """
+        half_lap = self.lap_length / 2.
+        return (progress - progress_prev + half_lap) % self.lap_length - half_lap
+
+    def leaderboard(self, cars):
+        """
+        Returns the cars ordered by their laps and progress on the lap,
+        the leader first.
+        """
+        return sorted(cars, key=lambda car: car.laps_total * self.lap_length
+                                            + car.progress, reverse=True)
+
+    def swept(self, marks, x0, y0, x1, y1):
+        """
+        Returns the marks (bits of an integer map such as self.marks)
+        that the line segments from (x0, y0) to (x1, y1) pass over.
+        The points are checked at most one pixel apart. The coordinates
+        are sequences with one segment per element, e.g. for several cars.
+        """
+        if len(x0) <= 8 and not kernels.ENABLED:
+            # for a single car plain Python is faster than NumPy
+            return self._swept_python(marks, x0, y0, x1, y1)
+        x0 = np.asarray(x0, dtype=float)
+        y0 = np.asarray(y0, dtype=float)
+        x1 = np.asarray(x1, dtype=float)
+        y1 = np.asarray(y1, dtype=float)
+        if kernels.ENABLED:
+            return kernels.swept_marks(marks, x0, y0, x1, y1)
+        return self._swept_numpy(marks, x0, y0, x1, y1)
+
+    def _swept_python(self, marks, x0, y0, x1, y1):
+        """
+        Check the segments one point at a time, as in _swept_numpy.
+        """
+        length = max([abs(xb - xa) for xa, xb in zip(x0, x1)] +
+                     [abs(yb - ya) for ya, yb in zip(y0, y1)] + [0.])
+        n_points = int(ceil(length)) + 1
+        step = 1. / (n_points - 1) if n_points > 1 else 0.
+        fractions = [jj * step for jj in range(n_points - 1)] + [1.]
+        width, height = marks.shape
+        passed = []
+        for xa, ya, xb, yb in zip(x0, y0, x1, y1):
+            mark = 0
+            for fraction in fractions:
+                x = min(max(int(xa * (1. - fraction) + xb * fraction), 0), width - 1)
+                y = min(max(int(ya * (1. - fraction) + yb * fraction), 0), height - 1)
+                mark |= marks.item(x, y)
+            passed.append(mark)
+        return passed
+
+    def _swept_numpy(self, marks, x0, y0, x1, y1):
+        """
+        Check the segments with NumPy. All segments are checked at the same
+        number of points, enough for the longest one.
+        """
+        length = np.max(np.maximum(np.abs(x1 - x0), np.abs(y1 - y0)), initial=0.)
+        n_points = int(np.ceil(length)) + 1
+        fractions = np.linspace(0., 1., n_points)
+        points_x = (x0[:, None] * (1. - fractions) + x1[:, None] * fractions).astype(int)
+        points_y = (y0[:, None] * (1. - fractions) + y1[:, None] * fractions).astype(int)
+        width, height = marks.shape
+        points_x = np.clip(points_x, 0, width - 1)
+        points_y = np.clip(points_y, 0, height - 1)
+        return np.bitwise_or.reduce(marks[points_x, points_y], axis=1)
+
+    def view_table(self, driver):
+        """
+        Returns the precomputed view table for the driver's view settings.
+        """
+        key = (driver.view_resolution, driver.view_angle, driver.view_distance)
+        if key not in self._view_tables:
+            start_direction = self.find_start(1)[1]
+            self._view_tables[key] = View_table(self.off_track_map, start_direction,
+                                                driver.view_angles,
+                                                driver.view_distances)
+        return self._view_tables[key]
+
+    def update_cars(self, cars):
+        """
+        Index the car positions for finding nearby cars.
+        Call once per frame before updating the cars; the cars are
+        found at their positions at that time.
+        """
+        self.cars = list(cars)
+        self._car_indices = dict((id(car), index) for index, car in enumerate(self.cars))
+        self.car_centers = np.array([car.rect.center for car in self.cars],
+                                    dtype=float).reshape(-1, 2)
+        self._car_grid.rebuild(self.car_centers[:, 0], self.car_centers[:, 1])
+
+    def cars_near(self, point_x, point_y, radius, exclude=None):
+        """
+        Returns the indices of the cars whose centers are within radius
+        of (x,y), except the excluded car.
+        """
+        indices = np.array(self._car_grid.query(point_x, point_y, radius), dtype=int)
+        centers = self.car_centers[indices]
+        near = indices[(centers[:, 0] - point_x)**2 + (centers[:, 1] - point_y)**2
+                       < radius**2]
+        if id(exclude) in self._car_indices:
+            near = near[near != self._car_indices[id(exclude)]]
+        return near
 
     def find_start(self, num_cars):
         """
@@ -0,0 +1,72 @@
+"""
+Train a neural network driver offline from a recorded demonstration dataset.
+The resulting checkpoint can be given to the ANN_Online and ANN_Batch drivers.
+
+Example:
+    python train_offline.py recordings/demonstration ann.npz --epochs 20
+"""
+import argparse
+import time
+
+import numpy as np
+
+import ann
+from dataset import Dataset
+
+
+def train(dataset, network, learning_rate, regularization, epochs,
+          mini_batch_size, prefetch=4):
+    """
+    Train the network with stochastic gradient descent over the dataset,
+    streaming the mini batches from disk.
+    """
+    n_batches = 0
+    for inputs_batch, wanted_batch in dataset.batches(mini_batch_size, epochs,
+                                                      prefetch):
+        network.train_minibatch(inputs_batch, wanted_batch, learning_rate,
+                                regularization / len(dataset))
+        n_batches += 1
+    return n_batches
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("dataset", help="recorded dataset directory")
+    parser.add_argument("checkpoint", help="output checkpoint file (.npz)")
+    parser.add_argument("--init", help="checkpoint to continue training from")
+    parser.add_argument("--hidden", type=int, default=5,
+                        help="number of hidden neurons")
+    parser.add_argument("--learning-rate", type=float, default=0.2)
+    parser.add_argument("--regularization", type=float, default=0.1)
+    parser.add_argument("--epochs", type=int, default=10)
+    parser.add_argument("--mini-batch-size", type=int, default=100)
+    parser.add_argument("--prefetch", type=int, default=4,
+                        help="number of mini batches to prepare ahead")
+    parser.add_argument("--seed", type=int, help="random seed")
+    args = parser.parse_args()
+    if args.mini_batch_size < 1:
+        parser.error("--mini-batch-size must be at least 1")
+
+    if args.seed is not None:
+        np.random.seed(args.seed)
+
+    dataset = Dataset(args.dataset)
+    network = ann.ANN(dataset.n_inputs, args.hidden, dataset.n_outputs)
+    if args.init:
+        network.load(args.init)
+
+    print("Training {} samples for {} epochs in batches of {}".format(
+          len(dataset), args.epochs, args.mini_batch_size))
+    start_time = time.time()
+    n_batches = train(dataset, network, args.learning_rate, args.regularization,
+                      args.epochs, args.mini_batch_size, args.prefetch)
+    print("Trained {} mini batches in {:.1f} s".format(
+          n_batches, time.time() - start_time))
+
+    network.save(args.checkpoint)
+    print("Saved checkpoint " + args.checkpoint)
+
+
+if __name__ == '__main__':
+    main()
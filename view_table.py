@@ -0,0 +1,174 @@
+"""
+Precompute the view table of the track for given view settings, so that
+drivers can look up their view fields (constants.VIEW_TABLE). The table
+is built in a process pool and cached on disk.
+
+Examples:
+    python view_table.py
+    python view_table.py --view-resolution 9x8 --view-angle 90
+"""
+import argparse
+import hashlib
+import multiprocessing
+import os
+
+import numpy as np
+
+import constants
+
+# cars turn in TURN_SPEED steps from the start direction
+N_HEADINGS = int(round(2. * np.pi / constants.TURN_SPEED))
+
+
+class View_table(object):
+    """
+    This class implements a precomputed table of view fields on a track
+    for given view settings. The table maps the car center (x, y) and
+    heading index to the bit-packed view field, so looking is a single
+    lookup. The table is built once in parallel and cached on disk as a
+    .npy file, which every process maps read-only into memory.
+
+    Headings are indexed by the number of TURN_SPEED turns from the start
+    direction, since that is how the cars turn. N_HEADINGS turns are not
+    exactly a full circle, so Car.turn wraps the direction onto these
+    headings; otherwise the car would slowly drift off the table headings.
+
+    The table is only built if build is True, since building starts a
+    process pool; run this module to build it before playing.
+    """
+    def __init__(self, off_track_map, start_direction, view_angles,
+                 view_distances, cache_dir=constants.CACHE_DIR, n_workers=None,
+                 build=False):
+        self.start_direction = start_direction
+        self.view_resolution = (len(view_angles), len(view_distances))
+        self.n_bits = len(view_angles) * len(view_distances)
+
+        key = hashlib.sha1()
+        for item in [off_track_map, np.array([start_direction, constants.TURN_SPEED,
+                                              constants.BLOCK_VIEW]),
+                     view_angles, view_distances]:
+            key.update(np.ascontiguousarray(item, dtype=float).tobytes())
+        self.filename = os.path.join(cache_dir,
+                                     "view_table_{}.npy".format(key.hexdigest()[:16]))
+        if not os.path.exists(self.filename):
+            if not build:
+                raise IOError("View table {} not found. Build it first with "
+                              "python view_table.py and the driver's view "
+                              "settings.".format(self.filename))
+            build_table(self.filename, off_track_map, start_direction,
+                        view_angles, view_distances, n_workers)
+        self.table = np.load(self.filename, mmap_mode='r')
+
+    def heading_index(self, direction):
+        """
+        Return the heading index of a direction.
+        """
+        return int(round((direction - self.start_direction) / constants.TURN_SPEED)) % N_HEADINGS
+
+    def lookup(self, center_x, center_y, direction):
+        """
+        Return the view field (flattened) for a car center and direction.
+        """
+        center_x = min(max(center_x, 0), self.table.shape[1] - 1)
+        center_y = min(max(center_y, 0), self.table.shape[2] - 1)
+        packed = self.table[self.heading_index(direction), center_x, center_y]
+        return np.unpackbits(packed, count=self.n_bits)
+
+
+def build_table(filename, off_track_map, start_direction, view_angles,
+                view_distances, n_workers=None):
+    """
+    Compute the view table for all headings in a process pool and save
+    it into filename.
+    """
+    directory = os.path.dirname(filename)
+    if directory and not os.path.isdir(directory):
+        os.makedirs(directory)
+    width, height = off_track_map.shape
+    n_bytes = (len(view_angles) * len(view_distances) + 7) // 8
+    tmp_filename = filename + ".{}.tmp".format(os.getpid())
+    table = np.lib.format.open_memmap(tmp_filename, mode='w+', dtype=np.uint8,
+                                      shape=(N_HEADINGS, width, height, n_bytes))
+    del table  # the workers write into the file
+
+    context = multiprocessing.get_context('spawn')
+    pool = context.Pool(n_workers, initializer=_init_worker,
+                        initargs=(tmp_filename, off_track_map,
+                                  view_angles, view_distances))
+    try:
+        directions = [start_direction + ii * constants.TURN_SPEED
+                      for ii in range(N_HEADINGS)]
+        pool.starmap(_build_heading, enumerate(directions))
+    finally:
+        pool.close()
+        pool.join()
+    os.replace(tmp_filename, filename)
+
+
+_worker_args = {}
+
+
+def _init_worker(filename, off_track_map, view_angles, view_distances):
+    _worker_args['table'] = np.load(filename, mmap_mode='r+')
+    _worker_args['off_track_map'] = off_track_map
+    _worker_args['view_angles'] = view_angles
+    _worker_args['view_distances'] = view_distances
+
+
+def _build_heading(heading_index, direction, rows_per_chunk=50):
+    """
+    Compute the view fields of all car centers for one heading, the
+    same way as Driver.look.
+    """
+    table = _worker_args['table']
+    off_track_map = _worker_args['off_track_map']
+    width, height = off_track_map.shape
+    offset_x = np.outer(np.cos(direction + _worker_args['view_angles']),
+                        _worker_args['view_distances']).ravel()
+    offset_y = np.outer(np.sin(direction + _worker_args['view_angles']),
+                        _worker_args['view_distances']).ravel()
+    n_distances = len(_worker_args['view_distances'])
+    centers_y = np.arange(height)[:, None]
+
+    for first_x in range(0, width, rows_per_chunk):
+        centers_x = np.arange(first_x, min(first_x + rows_per_chunk, width))
+        view_x = (centers_x[:, None, None] + offset_x).astype(int)
+        view_y = (centers_y - offset_y).astype(int)
+        view_x = np.where((view_x < 0) | (view_x >= width), 0, view_x)
+        view_y = np.where((view_y < 0) | (view_y >= height), 0, view_y)
+        view_field = off_track_map[view_x, view_y[None, :, :]] > 0.5
+
+        if constants.BLOCK_VIEW:  # block the view behind corners etc.
+            view_field = view_field.reshape(view_field.shape[:2] + (-1, n_distances))
+            view_field = np.maximum.accumulate(view_field, axis=-1)
+            view_field = view_field.reshape(view_field.shape[:2] + (-1,))
+        table[heading_index, centers_x] = np.packbits(view_field, axis=-1)
+    table.flush()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__,
+                        formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--view-distance", type=float, default=constants.MAX_VIEW_DISTANCE)
+    parser.add_argument("--view-resolution", default="{}x{}".format(*constants.VIEW_RESOLUTION),
+                        help="view resolution, e.g. 5x4")
+    parser.add_argument("--view-angle", type=float, default=constants.VIEW_ANGLE)
+    parser.add_argument("--workers", type=int, help="number of processes")
+    args = parser.parse_args()
+
+    from environment import init_headless
+    init_headless()
+    from track import Track
+    import driver
+
+    track = Track()
+    view_resolution = tuple(int(value) for value in args.view_resolution.split('x'))
+    reference = driver.Driver(args.view_distance, view_resolution, args.view_angle)
+    table = View_table(track.off_track_map, track.find_start(1)[1],
+                       reference.view_angles, reference.view_distances,
+                       n_workers=args.workers, build=True)
+    print("View table in " + table.filename)
+
+
+if __name__ == '__main__':
+    main()